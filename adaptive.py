@@ -0,0 +1,89 @@
+import time
+
+from config import ADAPTIVE_LADDER, ADAPTIVE_COOLDOWN_FRAMES, ADAPTIVE_HEADROOM, DETECTION_CONF, DETECTION_IOU, TRACKER_CONFIG
+from model_registry import session_model
+from inference import BatchTracker
+
+
+class AdaptiveController:
+    # Holds a target processing fps by moving along a ladder of (model, imgsz)
+    # configurations ordered from cheapest to most accurate. It steps down
+    # when the smoothed per-frame latency is over budget and steps back up
+    # when there is clear headroom; a level that had to be left is not
+    # retried for a while, so the controller doesn't oscillate around it.
+    def __init__(self, target_fps, ladder=ADAPTIVE_LADDER, cooldown=ADAPTIVE_COOLDOWN_FRAMES,
+                 headroom=ADAPTIVE_HEADROOM, smoothing=0.1):
+        self.budget = 1.0 / target_fps
+        self.ladder = [tuple(level) for level in ladder]
+        self.cooldown = cooldown
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self.level = len(self.ladder) - 1
+        self.latency = None
+        self.frames = 0
+        self.since_switch = 0
+        self.blocked_until = {}
+
+    @property
+    def config(self):
+        return self.ladder[self.level]
+
+    def observe(self, seconds_per_frame, frames=1):
+        if self.latency is None:
+            self.latency = seconds_per_frame
+        else:
+            self.latency += self.smoothing * (seconds_per_frame - self.latency)
+        self.frames += frames
+        self.since_switch += frames
+        if self.since_switch < self.cooldown:
+            return False
+        if self.latency > self.budget and self.level > 0:
+            self.blocked_until[self.level] = self.frames + self.cooldown * 10
+            return self._switch(self.level - 1)
+        up = self.level + 1
+        if (self.latency < self.budget * self.headroom and up < len(self.ladder)
+                and self.blocked_until.get(up, 0) <= self.frames):
+            return self._switch(up)
+        return False
+
+    def _switch(self, level):
+        self.level = level
+        self.latency = None
+        self.since_switch = 0
+        return True
+
+
+class AdaptiveTracker(BatchTracker):
+    # Runs detection with whatever configuration the controller currently
+    # picks and feeds one ByteTrack instance, so track ids survive a switch
+    # between model sizes. Each model size gets its own session copy.
+    # Every frame comes back as ((model, imgsz), results): the controller may
+    # already have switched by the time the frame is counted, so spans are
+    # recorded from the configuration that detected it.
+    def __init__(self, controller, conf=DETECTION_CONF, iou=DETECTION_IOU, tracker_config=TRACKER_CONFIG,
+                 band=None, gate=None):
+        self.controller = controller
+        self.models = {}
+        self.used = controller.config
+        model_path, imgsz = self.used
+        super().__init__(self.load(model_path), conf, iou, tracker_config, imgsz, band, gate)
+
+    def load(self, model_path):
+        model = self.models.get(model_path)
+        if model is None:
+            model = self.models[model_path] = session_model(model_path)
+        return model
+
+    def __call__(self, imgs):
+        # Frames the motion gate skips reuse the last detections, so they
+        # keep the configuration of the last detect call.
+        return [(self.used, result) for result in super().__call__(imgs)]
+
+    def detect(self, imgs):
+        self.used = self.controller.config
+        model_path, self.imgsz = self.used
+        self.model = self.load(model_path)
+        start = time.perf_counter()
+        results = super().detect(imgs)
+        self.controller.observe((time.perf_counter() - start) / len(imgs), len(imgs))
+        return results
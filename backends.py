@@ -0,0 +1,42 @@
+import os
+import threading
+
+from config import MODEL_PATH, INFERENCE_BACKEND, EXPORT_IMGSZ
+
+# Exported artifacts are written by ultralytics next to the weights:
+# yolov8m.pt -> yolov8m.onnx / yolov8m_openvino_model/
+BACKENDS = {
+    'torch': None,
+    'onnx': '.onnx',
+    'openvino': '_openvino_model',
+}
+
+_export_lock = threading.Lock()
+
+
+def exported_path(model_path, backend):
+    suffix = BACKENDS[backend]
+    if suffix is None:
+        return model_path
+    return os.path.splitext(model_path)[0] + suffix
+
+
+def is_stale(export_path, model_path):
+    if not os.path.exists(export_path):
+        return True
+    return os.path.exists(model_path) and os.path.getmtime(export_path) < os.path.getmtime(model_path)
+
+
+def resolve_model_path(model_path=MODEL_PATH, backend=INFERENCE_BACKEND, imgsz=EXPORT_IMGSZ):
+    # Returns the weights to load for this backend, exporting them first if
+    # there is no export yet or the .pt file is newer than the cached one.
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    path = exported_path(model_path, backend)
+    if path == model_path:
+        return model_path
+    with _export_lock:
+        if is_stale(path, model_path):
+            from ultralytics import YOLO
+            path = YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=True, verbose=False)
+    return path
@@ -0,0 +1,123 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+import cv2
+
+from config import MODEL_PATH, DB_PATH, BATCH_USER_EMAIL, BATCH_THREADS_PER_WORKER, INFERENCE_BATCH_SIZE, ADAPTIVE_TARGET_FPS, ADAPTIVE_LADDER
+from storage import connect, load_progress, load_analyzing
+from ingest import get_file_hash
+from model_registry import session_model
+from backends import resolve_model_path
+from adaptive import AdaptiveController
+from metrics import session_metrics, release
+from engine import video_info, analyze_capture
+from result_cache import analysis_params, cache_key, put_cached_result
+from job_runner import start_counting
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi')
+
+
+def collect_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(os.path.join(path, name))
+        else:
+            videos.append(path)
+    return videos
+
+
+def init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+
+def analyze_file(job):
+    # A failing video is reported as "error" instead of ending the pool run;
+    # its progress row stays 'analyzing', so --resume continues it.
+    video_path, user_email, db_path, model_path, speed, batch_size, force = job
+    video_hash = None
+    conn = connect(db_path)
+    try:
+        video_hash = get_file_hash(video_path)
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return video_path, video_hash, "error"
+        try:
+            info = video_info(cap)
+            status = load_progress(conn, user_email, video_hash, info[4])[4]
+            if status == "done" and not force:
+                return video_path, video_hash, "done"
+            params = analysis_params(model_path, speed)
+            result_key = cache_key(video_hash, params)
+            model = session_model(model_path)
+            metrics = session_metrics(os.path.basename(video_path))
+            engine = None
+            try:
+                engine = start_counting(conn, user_email, video_hash, video_path, info, speed, model.names, result_key,
+                                        metrics)
+                start_frame = engine.checkpoint.frame_count
+                controller = AdaptiveController(ADAPTIVE_TARGET_FPS) if ADAPTIVE_TARGET_FPS else None
+                frame_count = analyze_capture(model, cap, engine, speed, batch_size, start_frame=start_frame,
+                                              controller=controller, metrics=metrics)
+            finally:
+                release(metrics)
+                if engine is not None and engine.recorder is not None:
+                    engine.recorder.close()
+            engine.checkpoint.close(status="done")
+            if frame_count > start_frame:
+                put_cached_result(conn, result_key, video_hash, params, engine.counter, engine.minute_counter,
+                                  engine.fps, info[3], zones=engine.zones.results() if engine.zones is not None else None)
+        finally:
+            cap.release()
+        return video_path, video_hash, "done"
+    except Exception as e:
+        print(f"{video_path}: {type(e).__name__}: {e}", file=sys.stderr)
+        return video_path, video_hash, "error"
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse many videos in parallel worker processes")
+    parser.add_argument('paths', nargs='*', help="video files or directories")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // BATCH_THREADS_PER_WORKER))
+    parser.add_argument('--threads-per-worker', type=int, default=BATCH_THREADS_PER_WORKER)
+    parser.add_argument('--user', default=BATCH_USER_EMAIL, help="user_email the progress rows are stored under")
+    parser.add_argument('--speed', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=INFERENCE_BATCH_SIZE)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--resume', action='store_true', help="also resume videos still marked 'analyzing'")
+    parser.add_argument('--force', action='store_true', help="re-analyse videos already marked 'done'")
+    args = parser.parse_args(argv)
+
+    videos = collect_videos(args.paths)
+    if args.resume:
+        conn = connect(args.db)
+        for _, video_path in load_analyzing(conn, args.user):
+            if video_path and os.path.exists(video_path) and video_path not in videos:
+                videos.append(video_path)
+        conn.close()
+    if not videos:
+        parser.error("no videos to analyse")
+
+    # Export once here so the workers don't race to write the same artifact.
+    resolve_model_path(args.model)
+    if ADAPTIVE_TARGET_FPS:
+        for model_path in {level[0] for level in ADAPTIVE_LADDER}:
+            resolve_model_path(model_path)
+    jobs = [(path, args.user, args.db, args.model, args.speed, args.batch_size, args.force) for path in videos]
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(args.workers, initializer=init_worker, initargs=(args.threads_per_worker,)) as pool:
+        for video_path, video_hash, status in pool.imap_unordered(analyze_file, jobs):
+            print(f"{status:>8}  {video_hash}  {video_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from config import MODEL_PATH, INFERENCE_BATCH_SIZE, SCHEDULER_MAX_BATCH, SCHEDULER_JOB_BATCH
+from model_registry import session_model
+from frame_sampler import FrameSampler
+from pipeline import Pipeline
+from inference import make_infer, BatchTracker
+from scheduler import InferenceScheduler, ScheduledTracker
+from checkpoint import CheckpointWriter
+from storage import connect
+from track_state import TrackState
+from preview import PreviewPolicy
+from engine import CountingEngine, video_info, counting_line, empty_counter, empty_minute_counter
+from metrics import STAGES, StageMetrics
+from synthetic import ContourDetector, plan_vehicles, generate_video, ground_truth
+
+
+def summarize(samples):
+    if not samples:
+        return {'count': 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def accuracy(counter, minute_counter, truth_counter, truth_minute_counter):
+    per_class = {cls: {'expected': truth_counter[cls], 'counted': counter[cls]} for cls in truth_counter}
+    minute_error = sum(
+        abs(row[cls] - truth_row[cls])
+        for row, truth_row in zip(minute_counter, truth_minute_counter)
+        for cls in truth_row
+    )
+    abs_error = sum(abs(counter[cls] - truth_counter[cls]) for cls in truth_counter)
+    return {
+        'expected': sum(truth_counter.values()),
+        'counted': sum(counter.values()),
+        'abs_error': abs_error,
+        'minute_abs_error': minute_error,
+        'per_class': per_class,
+    }
+
+
+def synthetic_video(directory, width, height, seconds, fps, vehicles_per_minute, seed=0, max_stride=1):
+    # Videos are cached by their parameters; the vehicle plan is rebuilt from
+    # the seed, so the ground truth does not need to be stored alongside.
+    path = os.path.join(directory, f"synthetic_{width}x{height}_{seconds:g}s_{fps}fps_{vehicles_per_minute:g}vpm_"
+                                   f"{seed}_s{max_stride}.mp4")
+    if os.path.exists(path):
+        return path, plan_vehicles(width, height, fps, seconds, vehicles_per_minute, seed, max_stride)
+    return path, generate_video(path, width, height, fps, seconds, vehicles_per_minute, seed, max_stride)
+
+
+def run_case(video_path, vehicles, speed, detector='synthetic', batch_size=INFERENCE_BATCH_SIZE, model_path=MODEL_PATH, workdir=None):
+    cap = cv2.VideoCapture(video_path)
+    frame_width, frame_height, fps, total_frames, total_minutes = video_info(cap)
+    if detector == 'synthetic':
+        model = ContourDetector()
+        infer = BatchTracker(model)
+    else:
+        model = session_model(model_path)
+        infer = make_infer(model, batch_size)
+
+    # The same stage timers as the app, keeping every sample of the run.
+    metrics = StageMetrics(os.path.basename(video_path), window=None)
+    conn = connect(os.path.join(workdir, 'benchmark.db'))
+    counter, minute_counter, tracks = empty_counter(), empty_minute_counter(total_minutes), TrackState()
+    checkpoint = CheckpointWriter(conn, 'benchmark', os.path.basename(video_path), video_path,
+                                  0, counter, minute_counter, tracks, metrics=metrics)
+    engine = CountingEngine(model.names, counting_line(frame_width, frame_height), fps, total_minutes,
+                            counter, minute_counter, tracks, checkpoint)
+    preview = PreviewPolicy()
+    sampler = FrameSampler(cap, stride=speed)
+
+    frames = 0
+    start = time.perf_counter()
+    for frame_count, img, result in Pipeline(sampler, infer, batch_size=batch_size, metrics=metrics):
+        with metrics.time('postprocess'):
+            engine.process(frame_count, result, img)
+        if preview.due():
+            with metrics.time('render'):
+                preview.encode(img)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    checkpoint.close()
+    conn.close()
+    cap.release()
+
+    truth_counter, truth_minute_counter = ground_truth(vehicles, frame_height, fps, total_frames, total_minutes, stride=speed)
+    return {
+        'detector': detector,
+        'width': frame_width,
+        'height': frame_height,
+        'seconds': round(total_frames / fps, 2),
+        'speed': speed,
+        'batch_size': batch_size,
+        'frames': frames,
+        'elapsed': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        'stages': {stage: summarize(metrics.samples[stage]) for stage in STAGES},
+        'accuracy': accuracy(counter, minute_counter, truth_counter, truth_minute_counter),
+    }
+
+
+def case_key(case):
+    return case['detector'], case['width'], case['height'], case['seconds'], case['speed'], case['batch_size']
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(cases, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {case_key(case): case for case in json.load(f)['cases']}
+    for case in cases:
+        old = baseline.get(case_key(case))
+        if old is None or not old['fps']:
+            continue
+        change = (case['fps'] - old['fps']) / old['fps'] * 100
+        print(f"{case['width']}x{case['height']} {case['seconds']:g}s speed={case['speed']}: "
+              f"{old['fps']:.2f} -> {case['fps']:.2f} fps ({change:+.1f}%), "
+              f"abs_error {old['accuracy']['abs_error']} -> {case['accuracy']['abs_error']}")
+
+
+def run_suite(args):
+    video_dir = args.video_dir or tempfile.mkdtemp(prefix='vehicle_bench_videos_')
+    workdir = tempfile.mkdtemp(prefix='vehicle_bench_')
+    cases = []
+    try:
+        for resolution in args.resolutions:
+            width, height = map(int, resolution.lower().split('x'))
+            for seconds in args.lengths:
+                # Vehicles are slowed down for the largest stride, so every
+                # speed of the suite runs on the same video.
+                video_path, vehicles = synthetic_video(video_dir, width, height, seconds, args.fps,
+                                                       args.vehicles_per_minute, args.seed, max(args.speeds))
+                for speed in args.speeds:
+                    case = run_case(video_path, vehicles, speed, args.detector, args.batch_size, args.model, workdir)
+                    cases.append(case)
+                    stages = '  '.join(f"{stage}={case['stages'][stage].get('p50_ms', 0):.2f}" for stage in STAGES)
+                    print(f"{width}x{height} {seconds:g}s speed={speed}: {case['fps']:>8.2f} fps  "
+                          f"counted {case['accuracy']['counted']}/{case['accuracy']['expected']}  p50 ms: {stages}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if not args.video_dir:
+            shutil.rmtree(video_dir, ignore_errors=True)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'opencv': cv2.__version__,
+        'cpu_count': os.cpu_count(),
+        'model': args.model if args.detector == 'yolo' else None,
+        'cases': cases,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        compare(cases, args.baseline)
+    return report
+
+
+def run_batch_size(video_path, batch_size, max_frames, model_path=MODEL_PATH):
+    model = session_model(model_path)
+    cap = cv2.VideoCapture(video_path)
+    sampler = FrameSampler(cap)
+    frames = 0
+    start = time.perf_counter()
+    for _ in Pipeline(sampler, make_infer(model, batch_size), batch_size=batch_size):
+        frames += 1
+        if frames >= max_frames:
+            break
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return {
+        'batch_size': batch_size,
+        'frames': frames,
+        'seconds': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def run_batch_sizes(args):
+    rows = []
+    for batch_size in args.batch_sizes:
+        row = run_batch_size(args.video, batch_size, args.frames, args.model)
+        rows.append(row)
+        print(f"batch={row['batch_size']:>3}  frames={row['frames']:>5}  {row['seconds']:>8.2f}s  {row['fps']:>7.2f} fps")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+def run_sessions(video_path, sessions, max_frames, scheduled, batch_size, max_batch=SCHEDULER_MAX_BATCH, model_path=MODEL_PATH):
+    # Like concurrent jobs in the app: every session decodes the video and
+    # tracks on its own, either with its own model copy or through one
+    # shared scheduler.
+    scheduler = InferenceScheduler(session_model(model_path), max_batch) if scheduled else None
+    counts = [0] * sessions
+    errors = []
+
+    def work(i):
+        cap = cv2.VideoCapture(video_path)
+        infer = ScheduledTracker(scheduler) if scheduled else make_infer(session_model(model_path), batch_size)
+        try:
+            for _ in Pipeline(FrameSampler(cap), infer, batch_size=batch_size):
+                counts[i] += 1
+                if counts[i] >= max_frames:
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            cap.release()
+            if scheduled:
+                infer.close()
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    frames = sum(counts)
+    return {
+        'mode': 'scheduler' if scheduled else 'separate',
+        'sessions': sessions,
+        'batch_size': batch_size,
+        'frames': frames,
+        'seconds': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        'mean_pass': round(scheduler.frames / scheduler.batches, 2) if scheduled and scheduler.batches else None,
+    }
+
+
+def run_scheduler(args):
+    rows = []
+    for sessions in args.sessions:
+        for scheduled in (False, True):
+            row = run_sessions(args.video, sessions, args.frames, scheduled,
+                               args.batch_size if scheduled else INFERENCE_BATCH_SIZE, args.max_batch, args.model)
+            rows.append(row)
+            mean_pass = f"  {row['mean_pass']:>5.2f} frames/pass" if row['mean_pass'] is not None else ''
+            print(f"sessions={row['sessions']:>2}  {row['mode']:<9}  frames={row['frames']:>5}  "
+                  f"{row['seconds']:>8.2f}s  {row['fps']:>7.2f} fps{mean_pass}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and accuracy benchmarks for the counting pipeline")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    suite = sub.add_parser('suite', help="synthetic videos with known counts across speeds, resolutions and lengths")
+    suite.add_argument('--speeds', type=int, nargs='+', default=[1, 2, 4])
+    suite.add_argument('--resolutions', nargs='+', default=['640x360', '1280x720'])
+    suite.add_argument('--lengths', type=float, nargs='+', default=[60, 300], help="video lengths in seconds")
+    suite.add_argument('--fps', type=int, default=30)
+    suite.add_argument('--vehicles-per-minute', type=float, default=30)
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--detector', choices=['synthetic', 'yolo'], default='synthetic',
+                       help="'synthetic' finds the rectangles exactly; 'yolo' measures the real model's cost")
+    suite.add_argument('--batch-size', type=int, default=INFERENCE_BATCH_SIZE)
+    suite.add_argument('--model', default=MODEL_PATH)
+    suite.add_argument('--video-dir', help="keep generated videos here and reuse them between runs")
+    suite.add_argument('--baseline', help="earlier suite JSON to compare fps and accuracy against")
+    suite.add_argument('-o', '--output')
+    suite.set_defaults(run=run_suite)
+
+    batch = sub.add_parser('batch', help="frames/sec of detection+tracking per inference batch size on one video")
+    batch.add_argument('video')
+    batch.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    batch.add_argument('--frames', type=int, default=300)
+    batch.add_argument('--model', default=MODEL_PATH)
+    batch.add_argument('--output')
+    batch.set_defaults(run=run_batch_sizes)
+
+    scheduler = sub.add_parser('scheduler', help="total frames/sec of concurrent sessions, each with its own model "
+                                                 "or sharing the inference scheduler")
+    scheduler.add_argument('video')
+    scheduler.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4])
+    scheduler.add_argument('--frames', type=int, default=300, help="frames per session")
+    scheduler.add_argument('--batch-size', type=int, default=SCHEDULER_JOB_BATCH, help="frames per scheduler request")
+    scheduler.add_argument('--max-batch', type=int, default=SCHEDULER_MAX_BATCH)
+    scheduler.add_argument('--model', default=MODEL_PATH)
+    scheduler.add_argument('--output')
+    scheduler.set_defaults(run=run_scheduler)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import json
+import time
+
+from config import (
+    VEHICLE_CLASSES,
+    CHECKPOINT_FLUSH_FRAMES,
+    CHECKPOINT_FLUSH_SECONDS,
+    CHECKPOINT_SNAPSHOT_EVERY,
+)
+from metrics import NULL_METRICS
+
+
+def init_journal(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS progress_delta (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT,
+            video_hash TEXT,
+            frame_count INTEGER,
+            crossings_json TEXT,
+            positions_json TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_progress_delta_video ON progress_delta (user_email, video_hash, id)')
+    conn.commit()
+
+
+def write_snapshot(conn, user_email, video_hash, video_path, frame_count, counter, minute_counter, tracks, status,
+                   config_spans=None, result_key=None):
+    prev_y2_dict, totalcounts = tracks.to_json()
+    conn.execute('DELETE FROM progress_delta WHERE user_email=? AND video_hash=?', (user_email, video_hash))
+    conn.execute('''
+        INSERT INTO progress (user_email, video_hash, video_path, frame_count, counter_json, minute_counter_json, prev_y2_dict_json, totalcounts_json, status, config_spans_json, result_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_email, video_hash) DO UPDATE SET
+            video_path=excluded.video_path,
+            frame_count=excluded.frame_count,
+            counter_json=excluded.counter_json,
+            minute_counter_json=excluded.minute_counter_json,
+            prev_y2_dict_json=excluded.prev_y2_dict_json,
+            totalcounts_json=excluded.totalcounts_json,
+            status=excluded.status,
+            config_spans_json=excluded.config_spans_json,
+            result_key=excluded.result_key,
+            last_update=CURRENT_TIMESTAMP
+    ''',
+        (
+            user_email,
+            video_hash,
+            video_path,
+            frame_count,
+            json.dumps(counter),
+            json.dumps(minute_counter),
+            json.dumps(prev_y2_dict),
+            json.dumps(totalcounts),
+            status,
+            json.dumps(config_spans) if config_spans else None,
+            result_key
+        )
+    )
+    conn.commit()
+
+
+def extend_spans(spans, frame_count, model, imgsz):
+    if spans and spans[-1][2] == model and spans[-1][3] == imgsz:
+        spans[-1][1] = frame_count
+        return False
+    spans.append([frame_count, frame_count, model, imgsz])
+    return True
+
+
+def replay_deltas(conn, user_email, video_hash, frame_count, counter, minute_counter, tracks):
+    rows = conn.execute('SELECT frame_count, crossings_json, positions_json FROM progress_delta WHERE user_email=? AND video_hash=? ORDER BY id', (user_email, video_hash))
+    for row in rows:
+        frame_count = row[0]
+        for track_id, y2 in json.loads(row[2]).items():
+            tracks.update(int(track_id), y2)
+        for track_id, cls, minute in json.loads(row[1]):
+            if not tracks.mark_counted(track_id):
+                continue
+            counter[cls] += 1
+            while len(minute_counter) <= minute:
+                minute_counter.append({c: 0 for c in VEHICLE_CLASSES})
+            minute_counter[minute][cls] += 1
+    return frame_count
+
+
+class CheckpointWriter:
+    # config_spans lists [start_frame, end_frame, model, imgsz] for each run
+    # of frames analysed with one detector configuration (see adaptive.py).
+    # result_key (result_cache.cache_key) records which analysis parameters
+    # the progress belongs to, so it is only resumed with the same ones.
+    def __init__(self, conn, user_email, video_hash, video_path, frame_count, counter, minute_counter, tracks,
+                 flush_frames=CHECKPOINT_FLUSH_FRAMES, flush_seconds=CHECKPOINT_FLUSH_SECONDS,
+                 snapshot_every=CHECKPOINT_SNAPSHOT_EVERY, config_spans=None, metrics=NULL_METRICS, result_key=None):
+        self.conn = conn
+        self.user_email = user_email
+        self.video_hash = video_hash
+        self.video_path = video_path
+        self.counter = counter
+        self.minute_counter = minute_counter
+        self.tracks = tracks
+        self.flush_frames = flush_frames
+        self.flush_seconds = flush_seconds
+        self.snapshot_every = snapshot_every
+        self.frame_count = frame_count
+        self.config_spans = config_spans if config_spans is not None else []
+        self.spans_dirty = False
+        self.metrics = metrics
+        self.result_key = result_key
+        self._reset()
+        self.flushes = 0
+
+    def _reset(self):
+        self.crossings = []
+        self.positions = {}
+        self.pending_frames = 0
+        self.last_flush = time.monotonic()
+
+    def record_crossing(self, track_id, cls, minute):
+        self.crossings.append((track_id, cls, minute))
+
+    def record_position(self, track_id, y2):
+        self.positions[str(track_id)] = y2
+
+    def record_positions(self, track_ids, y2s):
+        self.positions.update(zip(map(str, track_ids), y2s))
+
+    def record_config(self, frame_count, model, imgsz):
+        if extend_spans(self.config_spans, frame_count, model, imgsz):
+            self.spans_dirty = True
+
+    def advance(self, frame_count):
+        self.frame_count = frame_count
+        self.pending_frames += 1
+        if self.pending_frames >= self.flush_frames or time.monotonic() - self.last_flush >= self.flush_seconds:
+            with self.metrics.time('persistence'):
+                self.flush()
+            return True
+        return False
+
+    def flush(self):
+        if not self.pending_frames:
+            return
+        self.flushes += 1
+        if self.flushes >= self.snapshot_every:
+            self.snapshot("analyzing")
+            return
+        self.conn.execute('INSERT INTO progress_delta (user_email, video_hash, frame_count, crossings_json, positions_json) VALUES (?, ?, ?, ?, ?)',
+            (
+                self.user_email,
+                self.video_hash,
+                self.frame_count,
+                json.dumps(self.crossings),
+                json.dumps(self.positions)
+            )
+        )
+        if self.spans_dirty:
+            self.conn.execute('UPDATE progress SET config_spans_json=? WHERE user_email=? AND video_hash=?',
+                              (json.dumps(self.config_spans), self.user_email, self.video_hash))
+            self.spans_dirty = False
+        self.conn.commit()
+        self._reset()
+
+    def snapshot(self, status):
+        write_snapshot(self.conn, self.user_email, self.video_hash, self.video_path, self.frame_count,
+                       self.counter, self.minute_counter, self.tracks, status, self.config_spans,
+                       self.result_key)
+        self.spans_dirty = False
+        self._reset()
+        self.flushes = 0
+
+    def close(self, status="done"):
+        self.snapshot(status)
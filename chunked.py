@@ -0,0 +1,155 @@
+import argparse
+import multiprocessing
+import os
+
+import cv2
+
+from config import (
+    MODEL_PATH,
+    INFERENCE_BATCH_SIZE,
+    BATCH_THREADS_PER_WORKER,
+    CHUNK_OVERLAP_SECONDS,
+    CHUNK_MATCH_SECONDS,
+    CHUNK_MATCH_PX,
+)
+from model_registry import session_model
+from backends import resolve_model_path
+from batch import init_worker
+from engine import (
+    CountingEngine,
+    video_info,
+    counting_line,
+    analyze_capture,
+    frame_minute,
+    empty_counter,
+    empty_minute_counter,
+    write_result,
+)
+
+
+def plan_chunks(total_frames, fps, workers, overlap_seconds=CHUNK_OVERLAP_SECONDS):
+    # Chunk i starts reading at its boundary, spends `overlap` frames warming
+    # up ByteTrack, and then owns crossings up to the next boundary + overlap,
+    # which is where chunk i+1 has finished its own warm-up. The owned ranges
+    # tile the video exactly once.
+    overlap = int(overlap_seconds * fps)
+    size = max(1, -(-total_frames // max(1, workers)))
+    bounds = list(range(0, total_frames, size)) + [total_frames]
+    chunks = []
+    for i in range(len(bounds) - 1):
+        start = bounds[i]
+        count_from = 0 if i == 0 else start + overlap
+        count_until = None if i == len(bounds) - 2 else bounds[i + 1] + overlap
+        stop = None if count_until is None else min(count_until, total_frames)
+        chunks.append((i, start, count_from, count_until, stop))
+    return chunks
+
+
+def analyze_chunk(job):
+    index, video_path, model_path, start, count_from, count_until, stop, speed, batch_size = job
+    model = session_model(model_path)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        frame_width, frame_height, fps, total_frames, total_minutes = video_info(cap)
+        engine = CountingEngine(model.names, counting_line(frame_width, frame_height), fps, total_minutes,
+                                count_from=count_from, count_until=count_until, events=[])
+        analyze_capture(model, cap, engine, speed, batch_size, start_frame=start, stop_frame=stop)
+    finally:
+        cap.release()
+    return index, count_from, engine.counter, engine.minute_counter, engine.events
+
+
+def find_duplicates(left_events, right_events, boundary, match_frames, match_px):
+    # A vehicle crossing right at a boundary can be seen by both neighbouring
+    # chunks with a frame or two of jitter; pair such events by class and
+    # horizontal position and keep only the left chunk's copy.
+    left = [e for e in left_events if boundary - match_frames <= e[0] < boundary]
+    used = set()
+    duplicates = []
+    for event in right_events:
+        frame, _, cls, cx = event
+        if frame >= boundary + match_frames:
+            continue
+        for i, (l_frame, _, l_cls, l_cx) in enumerate(left):
+            if i in used or l_cls != cls:
+                continue
+            if frame - l_frame <= match_frames and abs(cx - l_cx) <= match_px:
+                used.add(i)
+                duplicates.append(event)
+                break
+    return duplicates
+
+
+def merge_chunks(chunk_results, fps, total_minutes, match_seconds=CHUNK_MATCH_SECONDS, match_px=CHUNK_MATCH_PX):
+    chunk_results = sorted(chunk_results, key=lambda r: r[0])
+    match_frames = max(1, int(match_seconds * fps))
+    counter = empty_counter()
+    minute_counter = empty_minute_counter(total_minutes)
+    duplicates = 0
+    for i, (_, count_from, chunk_counter, chunk_minute_counter, events) in enumerate(chunk_results):
+        for cls, value in chunk_counter.items():
+            counter[cls] += value
+        for m, row in enumerate(chunk_minute_counter[:total_minutes]):
+            for cls, value in row.items():
+                minute_counter[m][cls] += value
+        if i == 0:
+            continue
+        for frame, _, cls, _ in find_duplicates(chunk_results[i - 1][4], events, count_from, match_frames, match_px):
+            counter[cls] -= 1
+            minute_counter[frame_minute(frame, fps, total_minutes)][cls] -= 1
+            duplicates += 1
+    return counter, minute_counter, duplicates
+
+
+def analyze_video_chunked(video_path, workers, speed=1, model_path=MODEL_PATH, batch_size=INFERENCE_BATCH_SIZE,
+                          threads_per_worker=BATCH_THREADS_PER_WORKER, overlap_seconds=CHUNK_OVERLAP_SECONDS):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {video_path}")
+    _, _, fps, total_frames, total_minutes = video_info(cap)
+    cap.release()
+
+    jobs = [
+        (index, video_path, model_path, start, count_from, count_until, stop, speed, batch_size)
+        for index, start, count_from, count_until, stop in plan_chunks(total_frames, fps, workers, overlap_seconds)
+    ]
+    if not jobs:
+        raise ValueError(f"Video has no frames: {video_path}")
+    resolve_model_path(model_path)
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(len(jobs), initializer=init_worker, initargs=(threads_per_worker,)) as pool:
+        chunk_results = pool.map(analyze_chunk, jobs)
+
+    counter, minute_counter, duplicates = merge_chunks(chunk_results, fps, total_minutes)
+    return {
+        'video': video_path,
+        'fps': fps,
+        'total_frames': total_frames,
+        'chunks': len(jobs),
+        'duplicates_removed': duplicates,
+        'counter': counter,
+        'minute_counter': minute_counter,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse one long video as parallel, overlapping time chunks")
+    parser.add_argument('video')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // BATCH_THREADS_PER_WORKER))
+    parser.add_argument('--threads-per-worker', type=int, default=BATCH_THREADS_PER_WORKER)
+    parser.add_argument('--overlap', type=float, default=CHUNK_OVERLAP_SECONDS, help="tracker warm-up overlap in seconds")
+    parser.add_argument('--speed', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=INFERENCE_BATCH_SIZE)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--format', choices=['json', 'csv'])
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    result = analyze_video_chunked(args.video, args.workers, speed=args.speed, model_path=args.model,
+                                   batch_size=args.batch_size, threads_per_worker=args.threads_per_worker,
+                                   overlap_seconds=args.overlap)
+    write_result(result, args.output, args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import os
+import tempfile
+
+MODEL_PATH = 'yolov8m.pt'
+VEHICLE_CLASSES = ['bicycle', 'motorcycle', 'car', 'bus', 'truck']
+VEHICLE_COLORS = {
+    'car': ((70, 130, 180), (100, 180, 255)),
+    'motorcycle': ((0, 191, 255), (100, 255, 255)),
+    'bus': ((0, 102, 204), (0, 180, 255)),
+    'truck': ((0, 153, 255), (100, 200, 255)),
+    'bicycle': ((0, 102, 255), (100, 180, 255))
+}
+speed_factors = [1, 2, 4, 6, 8]
+MAX_FILE_SIZE_MB = 1024
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), 'vehicle_uploads')
+INGEST_CHUNK_SIZE = 1024 * 1024
+MODEL_WARMUP_IMGSZ = 640
+# Inference runtime: 'torch', or 'onnx'/'openvino' to export MODEL_PATH once
+# (cached next to the weights) and run the export on CPU through that runtime.
+INFERENCE_BACKEND = 'torch'
+EXPORT_IMGSZ = 640
+DETECTION_CONF = 0.3
+DETECTION_IOU = 0.5
+TRACKER_CONFIG = 'bytetrack.yaml'
+
+# Skipped gaps at least this long are crossed with a seek instead of grab().
+SEEK_MIN_STRIDE = 30
+# When set, frames are sampled to this rate instead of the fixed speed stride.
+ANALYSIS_TARGET_FPS = None
+# Per-detection track records for re-counting without re-running YOLO.
+# A store is deleted with its result cache entry, and the least recently
+# written stores are deleted once all of them exceed DETECTIONS_MAX_BYTES.
+DETECTION_STORE_ENABLED = True
+DETECTIONS_DIR = 'detections'
+DETECTION_FLUSH_RECORDS = 4096
+DETECTIONS_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Live preview in the UI: refresh rate cap, max width and JPEG quality.
+# Background jobs also cap the rate at one preview per JOB_POLL_SECONDS.
+PREVIEW_MAX_FPS = 5
+PREVIEW_MAX_WIDTH = 960
+PREVIEW_JPEG_QUALITY = 75
+# When set, adaptive.py switches between the ADAPTIVE_LADDER (model, imgsz)
+# levels, cheapest first, to hold this many analysed frames per second.
+# A level is kept for at least ADAPTIVE_COOLDOWN_FRAMES, and stepping up
+# needs the latency to be under ADAPTIVE_HEADROOM of the per-frame budget.
+ADAPTIVE_TARGET_FPS = None
+ADAPTIVE_LADDER = [
+    ('yolov8n.pt', 320),
+    ('yolov8n.pt', 480),
+    ('yolov8n.pt', 640),
+    ('yolov8s.pt', 480),
+    ('yolov8s.pt', 640),
+    ('yolov8m.pt', 640),
+]
+ADAPTIVE_COOLDOWN_FRAMES = 30
+ADAPTIVE_HEADROOM = 0.7
+# Optional pre-inference stage: detect only in a band around the counting
+# line (fractions of the frame height above/below it), and reuse the last
+# detections on frames where less than MOTION_MIN_AREA of the band changed by
+# more than MOTION_PIXEL_THRESHOLD grey levels since the last detected frame.
+# At most MOTION_REFRESH_FRAMES frames in a row are skipped.
+ROI_ENABLED = False
+ROI_BAND_ABOVE = 0.4
+ROI_BAND_BELOW = 0.15
+MOTION_GATING = False
+MOTION_PIXEL_THRESHOLD = 25
+MOTION_MIN_AREA = 0.002
+MOTION_REFRESH_FRAMES = 15
+MOTION_SAMPLE_WIDTH = 160
+# Per-stage timing of the analysis loop (metrics.py): rolling percentiles
+# over the last METRICS_WINDOW samples, processing fps and queue depths,
+# served as Prometheus text on METRICS_HOST:METRICS_PORT/metrics and/or
+# rewritten to METRICS_FILE every METRICS_EXPORT_SECONDS. METRICS_DEBUG_PANEL
+# also shows them in the UI. Nothing is timed while METRICS_ENABLED is off.
+METRICS_ENABLED = False
+METRICS_WINDOW = 512
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = None
+METRICS_FILE = None
+METRICS_EXPORT_SECONDS = 5.0
+METRICS_DEBUG_PANEL = False
+# Max frames buffered between the decode, inference and render stages.
+PIPELINE_QUEUE_SIZE = 4
+# Frames per detection call for offline analysis; 1 keeps the model.track path.
+INFERENCE_BATCH_SIZE = 1
+
+DB_PATH = 'analisis_kendaraan.db'
+
+# Counting line height as a fraction of the frame height.
+COUNTING_LINE_RATIO = 0.8
+# Optional JSON file with extra counting lines/polygons (see zones.py),
+# counted in the same pass as the main line.
+ZONES_PATH = None
+# 5-minute recap: an interval is 'Macet' above MACET vehicles per minute,
+# 'Lancar' below LANCAR, and 'Sedang' in between.
+RECAP_INTERVAL_MINUTES = 5
+CONGESTION_MACET_PER_MINUTE = 600
+CONGESTION_LANCAR_PER_MINUTE = 400
+# stream.py: per-minute counts kept for a live source, the age in seconds
+# after which a captured frame is dropped instead of analysed, and the delay
+# before reopening a dropped camera connection.
+LIVE_WINDOW_MINUTES = 60
+LIVE_LATENCY_BUDGET = 1.0
+LIVE_RECONNECT_SECONDS = 2.0
+# Background analysis jobs (job_runner.py): at most JOB_WORKERS videos are
+# analysed at once per app process, whatever the number of users. Workers
+# write progress to the jobs table every JOB_PROGRESS_SECONDS and the page
+# polls it every JOB_POLL_SECONDS.
+JOB_WORKERS = 2
+JOB_PROGRESS_SECONDS = 1.0
+JOB_POLL_SECONDS = 0.5
+# Background jobs send their frames to one shared detector thread
+# (scheduler.py). Each forward pass takes up to SCHEDULER_MAX_BATCH frames,
+# round-robin across the jobs, and waits at most SCHEDULER_MAX_WAIT seconds
+# for jobs that have not submitted yet. ByteTrack stays per job. Each job
+# hands over SCHEDULER_JOB_BATCH frames at a time, so JOB_WORKERS jobs can
+# fill a pass, and fails if its frames are not back within
+# SCHEDULER_TIMEOUT seconds.
+SCHEDULER_ENABLED = True
+SCHEDULER_MAX_BATCH = 8
+SCHEDULER_MAX_WAIT = 0.005
+SCHEDULER_JOB_BATCH = 4
+SCHEDULER_TIMEOUT = 120.0
+# Finished results shared across users; least recently used entries are
+# evicted once the stored JSON exceeds this size.
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Checkpoint deltas are flushed when either threshold is reached; after
+# CHECKPOINT_SNAPSHOT_EVERY flushes the journal is folded into a full snapshot.
+CHECKPOINT_FLUSH_FRAMES = 30
+CHECKPOINT_FLUSH_SECONDS = 5.0
+CHECKPOINT_SNAPSHOT_EVERY = 50
+
+# Processed frames after which an unseen track id is dropped from TrackState.
+# Must stay above ByteTrack's track_buffer (30) so lost tracks can re-match.
+TRACK_MAX_AGE = 60
+
+# batch.py: progress rows are stored under this user_email, and each worker
+# process is limited to this many torch/OpenCV threads.
+BATCH_USER_EMAIL = 'batch'
+BATCH_THREADS_PER_WORKER = 2
+
+# chunked.py: seconds each chunk runs ahead of its owned range to warm up
+# ByteTrack, and the frame/pixel tolerance for pairing duplicate crossings
+# seen by both neighbours of a chunk boundary.
+CHUNK_OVERLAP_SECONDS = 5.0
+CHUNK_MATCH_SECONDS = 0.5
+CHUNK_MATCH_PX = 40
@@ -0,0 +1,249 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from config import (
+    DETECTIONS_DIR,
+    DETECTION_FLUSH_RECORDS,
+    DETECTIONS_MAX_BYTES,
+    COUNTING_LINE_RATIO,
+    CONGESTION_MACET_PER_MINUTE,
+    CONGESTION_LANCAR_PER_MINUTE,
+)
+from engine import CountingEngine, counting_line, recap_rows, write_result
+from zones import ZoneCounter, load_zones
+
+# One fixed-size record per tracked box, appended in frame order to
+# <name>.trk; <name>.frames lists every processed frame (including empty
+# ones) and <name>.json holds the video metadata. Both binary files are
+# plain arrays that np.memmap can open directly.
+RECORD_DTYPE = np.dtype([
+    ('frame', '<i4'),
+    ('track_id', '<i4'),
+    ('cls', '<i2'),
+    ('x1', '<i2'),
+    ('y1', '<i2'),
+    ('x2', '<i2'),
+    ('y2', '<i2'),
+])
+FRAME_DTYPE = np.dtype('<i4')
+
+
+def detection_path(result_key, user_email, directory=DETECTIONS_DIR):
+    # result_key (result_cache.cache_key) covers the video and every analysis
+    # parameter; the user suffix gives each progress row its own writer, so
+    # two users analysing the same upload never share or truncate a file.
+    owner = hashlib.sha1(user_email.encode()).hexdigest()[:10]
+    return os.path.join(directory, f"{result_key}_{owner}")
+
+
+def _stores(directory):
+    # {base path: [(file path, size, mtime), ...]} for every store in directory.
+    stores = {}
+    if not os.path.isdir(directory):
+        return stores
+    for name in os.listdir(directory):
+        base, ext = os.path.splitext(name)
+        if ext not in ('.trk', '.frames', '.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stores.setdefault(os.path.join(directory, base), []).append((path, stat.st_size, stat.st_mtime))
+    return stores
+
+
+def _remove(files):
+    for path, _, _ in files:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+
+
+def remove_detections(result_key, directory=DETECTIONS_DIR):
+    # Every user's store for one result cache entry.
+    for base, files in _stores(directory).items():
+        if os.path.basename(base).startswith(f"{result_key}_"):
+            _remove(files)
+
+
+def prune_detections(max_bytes=DETECTIONS_MAX_BYTES, directory=DETECTIONS_DIR):
+    # Deletes the least recently written stores until the rest fit in
+    # max_bytes; a running analysis keeps writing its store, so it goes last.
+    stores = _stores(directory)
+    total = sum(size for files in stores.values() for _, size, _ in files)
+    if total <= max_bytes:
+        return
+    for base, files in sorted(stores.items(), key=lambda item: max(mtime for _, _, mtime in item[1])):
+        if total <= max_bytes:
+            break
+        _remove(files)
+        total -= sum(size for _, size, _ in files)
+
+
+def detection_meta(video_hash, names, fps, frame_width, frame_height, total_frames, total_minutes, speed):
+    return {
+        'video_hash': video_hash,
+        'names': {int(k): v for k, v in dict(names).items()},
+        'fps': fps,
+        'width': frame_width,
+        'height': frame_height,
+        'total_frames': total_frames,
+        'total_minutes': total_minutes,
+        'speed': speed,
+    }
+
+
+def _truncate(path, dtype, field, start_frame):
+    if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+        return
+    data = np.memmap(path, dtype=dtype, mode='r')
+    values = data[field] if field else data
+    keep = int(np.searchsorted(values, start_frame, side='right'))
+    del data, values
+    os.truncate(path, keep * dtype.itemsize)
+
+
+class DetectionWriter:
+    def __init__(self, base_path, meta, start_frame=0, flush_records=DETECTION_FLUSH_RECORDS):
+        self.base_path = base_path
+        self.flush_records = flush_records
+        self.records = []
+        self.frames = []
+        self.buffered = 0
+        directory = os.path.dirname(base_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if start_frame:
+            _truncate(base_path + '.trk', RECORD_DTYPE, 'frame', start_frame)
+            _truncate(base_path + '.frames', FRAME_DTYPE, None, start_frame)
+        else:
+            for ext in ('.trk', '.frames'):
+                if os.path.exists(base_path + ext):
+                    os.remove(base_path + ext)
+        with open(base_path + '.json', 'w') as f:
+            json.dump(meta, f)
+
+    def append(self, frame_count, ids, cls, xyxy):
+        n = len(ids)
+        if not n:
+            return
+        rec = np.empty(n, dtype=RECORD_DTYPE)
+        rec['frame'] = frame_count
+        rec['track_id'] = ids
+        rec['cls'] = cls
+        rec['x1'] = xyxy[:, 0]
+        rec['y1'] = xyxy[:, 1]
+        rec['x2'] = xyxy[:, 2]
+        rec['y2'] = xyxy[:, 3]
+        self.records.append(rec)
+        self.buffered += n
+
+    def add_frame(self, frame_count):
+        self.frames.append(frame_count)
+        if self.buffered >= self.flush_records:
+            self.flush()
+
+    def flush(self):
+        if self.records:
+            with open(self.base_path + '.trk', 'ab') as f:
+                np.concatenate(self.records).tofile(f)
+        if self.frames:
+            with open(self.base_path + '.frames', 'ab') as f:
+                np.asarray(self.frames, dtype=FRAME_DTYPE).tofile(f)
+        self.records = []
+        self.frames = []
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+
+
+def load_detections(base_path):
+    with open(base_path + '.json') as f:
+        meta = json.load(f)
+    records = np.memmap(base_path + '.trk', dtype=RECORD_DTYPE, mode='r') if os.path.exists(base_path + '.trk') and os.path.getsize(base_path + '.trk') else np.empty(0, dtype=RECORD_DTYPE)
+    frames = np.fromfile(base_path + '.frames', dtype=FRAME_DTYPE) if os.path.exists(base_path + '.frames') else np.empty(0, dtype=FRAME_DTYPE)
+    return meta, records, frames
+
+
+def replay(engine, records, frames):
+    bounds = np.searchsorted(records['frame'], frames, side='left')
+    ends = np.searchsorted(records['frame'], frames, side='right')
+    for frame_count, lo, hi in zip(frames.tolist(), bounds.tolist(), ends.tolist()):
+        if hi > lo:
+            rec = records[lo:hi]
+            xyxy = np.stack([rec['x1'], rec['y1'], rec['x2'], rec['y2']], axis=1).astype(int)
+            engine.process_arrays(frame_count, xyxy, rec['cls'].astype(int), rec['track_id'].astype(int))
+        engine.finish_frame(frame_count)
+    return engine
+
+
+def restore_zones(base_path, zone_counter):
+    # Rebuilds zone counts and per-track zone state from the records stored
+    # so far when an analysis is resumed; only the zones are fed, the main
+    # line keeps its own checkpointed state.
+    if not os.path.exists(base_path + '.json'):
+        return False
+    meta, records, frames = load_detections(base_path)
+    names = {int(k): v for k, v in meta['names'].items()}
+    limits = counting_line(meta['width'], meta['height'])
+    replay(CountingEngine(names, limits, meta['fps'], meta['total_minutes'], zones=zone_counter), records, frames)
+    return True
+
+
+def recount(base_path, line_ratio=COUNTING_LINE_RATIO, limits=None,
+            macet=CONGESTION_MACET_PER_MINUTE, lancar=CONGESTION_LANCAR_PER_MINUTE, zones_path=None):
+    meta, records, frames = load_detections(base_path)
+    names = {int(k): v for k, v in meta['names'].items()}
+    if limits is None:
+        limits = counting_line(meta['width'], meta['height'], line_ratio)
+    zones = None
+    if zones_path:
+        zones = ZoneCounter(load_zones(zones_path, meta['width'], meta['height']), meta['total_minutes'])
+    engine = CountingEngine(names, limits, meta['fps'], meta['total_minutes'], zones=zones)
+    replay(engine, records, frames)
+    result = {
+        'video_hash': meta.get('video_hash'),
+        'fps': meta['fps'],
+        'total_frames': meta['total_frames'],
+        'limits': limits,
+        'counter': engine.counter,
+        'minute_counter': engine.minute_counter,
+        'recap': recap_rows(engine.minute_counter, meta['total_minutes'], macet=macet, lancar=lancar),
+    }
+    if zones is not None:
+        result['zones'] = zones.results()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recount crossings from stored detections without running YOLO again")
+    parser.add_argument('detections', help="detection file path without extension")
+    parser.add_argument('--line-ratio', type=float, default=COUNTING_LINE_RATIO)
+    parser.add_argument('--line-y', type=int, help="counting line height in pixels (overrides --line-ratio)")
+    parser.add_argument('--zones', help="JSON file with extra counting lines/polygons")
+    parser.add_argument('--macet', type=int, default=CONGESTION_MACET_PER_MINUTE, help="vehicles/minute above which an interval is 'Macet'")
+    parser.add_argument('--lancar', type=int, default=CONGESTION_LANCAR_PER_MINUTE, help="vehicles/minute below which an interval is 'Lancar'")
+    parser.add_argument('--format', choices=['json', 'csv'])
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    limits = None
+    if args.line_y is not None:
+        with open(args.detections + '.json') as f:
+            width = json.load(f)['width']
+        limits = [0, args.line_y, width, args.line_y]
+    result = recount(args.detections, args.line_ratio, limits, macet=args.macet, lancar=args.lancar,
+                     zones_path=args.zones)
+    write_result(result, args.output, args.format)
+
+
+if __name__ == '__main__':
+    main()
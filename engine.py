@@ -0,0 +1,337 @@
+import argparse
+import csv
+import json
+import sys
+
+import cv2
+import cvzone
+import numpy as np
+
+from config import (
+    MODEL_PATH,
+    VEHICLE_CLASSES,
+    VEHICLE_COLORS,
+    INFERENCE_BATCH_SIZE,
+    ANALYSIS_TARGET_FPS,
+    COUNTING_LINE_RATIO,
+    ZONES_PATH,
+    ADAPTIVE_TARGET_FPS,
+    RECAP_INTERVAL_MINUTES,
+    CONGESTION_MACET_PER_MINUTE,
+    CONGESTION_LANCAR_PER_MINUTE,
+)
+from track_state import TrackState
+from model_registry import session_model
+from frame_sampler import FrameSampler
+from pipeline import Pipeline
+from inference import make_infer
+from adaptive import AdaptiveController, AdaptiveTracker
+from checkpoint import extend_spans
+from roi import make_prefilter
+from metrics import NULL_METRICS, session_metrics, release
+
+
+def video_info(cap):
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps <= 0:
+        fps = 30
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration_seconds = total_frames / fps
+    total_minutes = int(duration_seconds // 60)
+    if duration_seconds % 60 > 0:
+        total_minutes += 1
+    return frame_width, frame_height, fps, total_frames, total_minutes
+
+
+def counting_line(frame_width, frame_height, ratio=COUNTING_LINE_RATIO):
+    return [
+        0,
+        int(ratio * frame_height),
+        frame_width,
+        int(ratio * frame_height)
+    ]
+
+
+def empty_counter():
+    return {cls: 0 for cls in VEHICLE_CLASSES}
+
+
+def empty_minute_counter(total_minutes):
+    return [empty_counter() for _ in range(total_minutes)]
+
+
+def traffic_status(jumlah, minutes, macet=CONGESTION_MACET_PER_MINUTE, lancar=CONGESTION_LANCAR_PER_MINUTE):
+    if jumlah > macet * minutes:
+        return "Macet"
+    elif jumlah < lancar * minutes:
+        return "Lancar"
+    return "Sedang"
+
+
+def recap_rows(minute_counter, total_minutes, interval=RECAP_INTERVAL_MINUTES,
+               macet=CONGESTION_MACET_PER_MINUTE, lancar=CONGESTION_LANCAR_PER_MINUTE):
+    rows = []
+    for idx in range(total_minutes // interval):
+        start_min = idx * interval
+        end_min = (idx + 1) * interval
+        row_sum = empty_counter()
+        for m in range(start_min, end_min):
+            for cls in VEHICLE_CLASSES:
+                row_sum[cls] += minute_counter[m][cls]
+        jumlah = sum(row_sum.values())
+        rows.append(dict(menit=f"{start_min+1}-{end_min}", jumlah=jumlah,
+                         status=traffic_status(jumlah, end_min - start_min, macet, lancar), **row_sum))
+    return rows
+
+
+def frame_minute(frame_count, fps, total_minutes):
+    current_minute = int(frame_count / fps / 60)
+    if current_minute >= total_minutes:
+        current_minute = total_minutes - 1
+    return current_minute
+
+
+class CountingEngine:
+    # Crossings outside [count_from, count_until) still mark the track as
+    # counted but do not add to the counters; chunked analysis uses this for
+    # its tracker warm-up window. When events is a list, every counted
+    # crossing is appended to it as (frame_count, track_id, class, center_x).
+    # A recorder (detection_store.DetectionWriter) receives every tracked box
+    # and is flushed whenever the checkpoint is; a zones.ZoneCounter gets the
+    # same vehicle boxes for its extra lines and polygons.
+    def __init__(self, names, limits, fps, total_minutes, counter=None, minute_counter=None, tracks=None, checkpoint=None,
+                 count_from=0, count_until=None, events=None, recorder=None, zones=None):
+        self.names = names
+        self.class_mask = np.array([names[i] in VEHICLE_COLORS for i in range(len(names))], dtype=bool)
+        self.limits = limits
+        self.fps = fps
+        self.total_minutes = total_minutes
+        self.counter = counter if counter is not None else empty_counter()
+        self.minute_counter = minute_counter if minute_counter is not None else empty_minute_counter(total_minutes)
+        self.tracks = tracks if tracks is not None else TrackState()
+        self.checkpoint = checkpoint
+        self.count_from = count_from
+        self.count_until = count_until
+        self.events = events
+        self.recorder = recorder
+        self.zones = zones
+
+    def minute_of(self, frame_count):
+        return frame_minute(frame_count, self.fps, self.total_minutes)
+
+    def counts_frame(self, frame_count):
+        if frame_count < self.count_from:
+            return False
+        return self.count_until is None or frame_count < self.count_until
+
+    def process(self, frame_count, result, img=None):
+        for r in result:
+            boxes = r.boxes
+            if boxes is None or boxes.id is None or len(boxes) == 0:
+                continue
+            self.process_arrays(
+                frame_count,
+                boxes.xyxy.cpu().numpy().astype(int),
+                boxes.cls.cpu().numpy().astype(int),
+                boxes.id.cpu().numpy().astype(int),
+                img
+            )
+        return self.finish_frame(frame_count)
+
+    def process_arrays(self, frame_count, xyxy, cls, ids, img=None):
+        if self.recorder is not None:
+            self.recorder.append(frame_count, ids, cls, xyxy)
+        garis_y = self.limits[1]
+        current_minute = self.minute_of(frame_count)
+        counting = self.counts_frame(frame_count)
+
+        keep = (cls >= 0) & (cls < len(self.class_mask))
+        keep[keep] = self.class_mask[cls[keep]]
+        if not keep.any():
+            return
+        xyxy, cls, ids = xyxy[keep], cls[keep], ids[keep]
+        y2 = xyxy[:, 3]
+        id_list = ids.tolist()
+        y2_list = y2.tolist()
+
+        prev_y2 = np.array(self.tracks.get_y2_many(id_list, y2_list))
+        crossed = np.flatnonzero((prev_y2 < garis_y) & (y2 >= garis_y)).tolist()
+        counted = []
+        for i in crossed:
+            id = id_list[i]
+            if self.tracks.mark_counted(id) and counting:
+                currentClass = self.names[int(cls[i])]
+                self.counter[currentClass] += 1
+                self.minute_counter[current_minute][currentClass] += 1
+                if self.checkpoint is not None:
+                    self.checkpoint.record_crossing(id, currentClass, current_minute)
+                if self.events is not None:
+                    x1, x2 = int(xyxy[i, 0]), int(xyxy[i, 2])
+                    self.events.append((frame_count, id, currentClass, x1 + (x2 - x1) // 2))
+                counted.append(i)
+
+        if self.zones is not None:
+            self.zones.update(id_list, [self.names[c] for c in cls.tolist()], xyxy, current_minute, counting)
+        self.tracks.update_many(id_list, y2_list)
+        if self.checkpoint is not None:
+            self.checkpoint.record_positions(id_list, y2_list)
+        if img is not None:
+            self.draw(img, xyxy, cls, counted)
+
+    def finish_frame(self, frame_count):
+        self.tracks.end_frame()
+        if self.zones is not None:
+            self.zones.end_frame()
+        if self.recorder is not None:
+            self.recorder.add_frame(frame_count)
+        if self.checkpoint is not None and self.checkpoint.advance(frame_count) and self.recorder is not None:
+            self.recorder.flush()
+        return self.minute_of(frame_count)
+
+    def draw(self, img, xyxy, cls, counted):
+        LIMITS = self.limits
+        for (x1, y1, x2, y2), c in zip(xyxy.tolist(), cls.tolist()):
+            color, _ = VEHICLE_COLORS[self.names[c]]
+            cvzone.cornerRect(img, (x1, y1, x2 - x1, y2 - y1), l=9, rt=5, colorC=color)
+        cv2.line(img, (LIMITS[0], LIMITS[1]), (LIMITS[2], LIMITS[3]), (25, 118, 210), 5)
+        if self.zones is not None:
+            self.zones.draw(img)
+        for i in counted:
+            x1, y1, x2, y2 = xyxy[i].tolist()
+            cv2.line(img, (LIMITS[0], LIMITS[1]), (LIMITS[2], LIMITS[3]), (255, 255, 255), 5)
+            cv2.circle(img, (x1 + (x2 - x1) // 2, y1 + (y2 - y1) // 2), 10, (25, 118, 210), cv2.FILLED)
+
+
+def analyze_capture(model, cap, engine, speed=1, batch_size=INFERENCE_BATCH_SIZE, target_fps=ANALYSIS_TARGET_FPS, start_frame=0, stop_frame=None,
+                    controller=None, config_spans=None, metrics=NULL_METRICS):
+    # With a controller the detector configuration is chosen per batch, and
+    # the configuration used is recorded per frame span in the checkpoint
+    # (or in config_spans when there is none).
+    sampler = FrameSampler(cap, stride=speed, target_fps=target_fps, start_frame=start_frame)
+    band, gate = make_prefilter(engine.limits, int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    if controller is not None:
+        infer = AdaptiveTracker(controller, band=band, gate=gate)
+    else:
+        infer = make_infer(model, batch_size, band, gate)
+    frame_count = start_frame
+    for frame_count, _, result in Pipeline(sampler, infer, batch_size=batch_size, metrics=metrics):
+        if controller is not None:
+            config, result = result
+        with metrics.time('postprocess'):
+            engine.process(frame_count, result)
+        metrics.frame_done()
+        if controller is not None:
+            if engine.checkpoint is not None:
+                engine.checkpoint.record_config(frame_count, *config)
+            elif config_spans is not None:
+                extend_spans(config_spans, frame_count, *config)
+        if stop_frame is not None and frame_count >= stop_frame:
+            break
+    return frame_count
+
+
+def analyze_video(video_path, speed=1, model_path=MODEL_PATH, batch_size=INFERENCE_BATCH_SIZE, target_fps=ANALYSIS_TARGET_FPS,
+                  record_path=None, zones_path=None, adaptive_fps=ADAPTIVE_TARGET_FPS):
+    from detection_store import DetectionWriter, detection_meta
+    from zones import ZoneCounter, load_zones
+
+    model = session_model(model_path)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {video_path}")
+    frame_width, frame_height, fps, total_frames, total_minutes = video_info(cap)
+    recorder = None
+    if record_path:
+        recorder = DetectionWriter(record_path, detection_meta(None, model.names, fps, frame_width, frame_height,
+                                                               total_frames, total_minutes, speed))
+    zones = None
+    if zones_path:
+        zones = ZoneCounter(load_zones(zones_path, frame_width, frame_height), total_minutes)
+    engine = CountingEngine(model.names, counting_line(frame_width, frame_height), fps, total_minutes,
+                            recorder=recorder, zones=zones)
+    controller = AdaptiveController(adaptive_fps) if adaptive_fps else None
+    config_spans = []
+    metrics = session_metrics(video_path)
+    try:
+        frame_count = analyze_capture(model, cap, engine, speed, batch_size, target_fps,
+                                      controller=controller, config_spans=config_spans, metrics=metrics)
+    finally:
+        release(metrics)
+        cap.release()
+        if recorder is not None:
+            recorder.close()
+    result = {
+        'video': video_path,
+        'fps': fps,
+        'total_frames': total_frames,
+        'frame_count': frame_count,
+        'counter': engine.counter,
+        'minute_counter': engine.minute_counter,
+    }
+    if zones is not None:
+        result['zones'] = zones.results()
+    if controller is not None:
+        result['config_spans'] = config_spans
+    return result
+
+
+def write_json(result, f):
+    json.dump(result, f, indent=2)
+    f.write('\n')
+
+
+def write_csv(result, f):
+    writer = csv.writer(f)
+    zones = result.get('zones')
+    if not zones:
+        writer.writerow(['minute'] + VEHICLE_CLASSES + ['total'])
+        for idx, row in enumerate(result['minute_counter']):
+            values = [row[cls] for cls in VEHICLE_CLASSES]
+            writer.writerow([idx + 1] + values + [sum(values)])
+        return
+    writer.writerow(['zone', 'minute'] + VEHICLE_CLASSES + ['total'])
+    series = [('main', result['minute_counter'])] + [(name, z['minute_counter']) for name, z in zones.items()]
+    for name, minute_counter in series:
+        for idx, row in enumerate(minute_counter):
+            values = [row[cls] for cls in VEHICLE_CLASSES]
+            writer.writerow([name, idx + 1] + values + [sum(values)])
+
+
+def write_result(result, output=None, fmt=None):
+    # Shared output of the command line tools: CSV when asked for or when the
+    # output file ends in .csv, JSON otherwise; stdout without an output file.
+    if fmt is None:
+        fmt = 'csv' if output and output.endswith('.csv') else 'json'
+    write = write_csv if fmt == 'csv' else write_json
+    if output:
+        with open(output, 'w', newline='') as f:
+            write(result, f)
+    else:
+        write(result, sys.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count vehicles crossing the line in a video, without the Streamlit UI")
+    parser.add_argument('video')
+    parser.add_argument('--speed', type=int, default=1, help="analyse every n-th frame")
+    parser.add_argument('--target-fps', type=float, default=ANALYSIS_TARGET_FPS)
+    parser.add_argument('--batch-size', type=int, default=INFERENCE_BATCH_SIZE)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--adaptive-fps', type=float, default=ADAPTIVE_TARGET_FPS,
+                        help="switch model size/resolution to hold this analysis fps")
+    parser.add_argument('--record', help="also store per-frame track records at this path for detection_store.py")
+    parser.add_argument('--zones', default=ZONES_PATH, help="JSON file with extra counting lines/polygons")
+    parser.add_argument('--format', choices=['json', 'csv'])
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    result = analyze_video(args.video, speed=args.speed, model_path=args.model,
+                           batch_size=args.batch_size, target_fps=args.target_fps, record_path=args.record, zones_path=args.zones,
+                           adaptive_fps=args.adaptive_fps)
+    write_result(result, args.output, args.format)
+
+
+if __name__ == '__main__':
+    main()
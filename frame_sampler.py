@@ -0,0 +1,42 @@
+import cv2
+
+from config import SEEK_MIN_STRIDE
+
+
+class FrameSampler:
+    # Only the sampled frames are decoded to BGR via cap.read(). Short gaps
+    # are skipped with cap.grab(), which advances the demuxer without the
+    # retrieve/colour-conversion step; gaps of SEEK_MIN_STRIDE frames or more
+    # (roughly one GOP) jump straight to the target with a seek instead.
+    def __init__(self, cap, stride=1, target_fps=None, start_frame=0, seek_min_stride=SEEK_MIN_STRIDE):
+        self.cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        if self.fps <= 0:
+            self.fps = 30
+        if target_fps:
+            stride = max(1, int(round(self.fps / target_fps)))
+        self.stride = max(1, int(stride))
+        self.seek_min_stride = seek_min_stride
+        self.position = start_frame
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    def read(self):
+        success, img = self.cap.read()
+        if not success:
+            return False, None
+        self.position += 1
+        self.skip(self.stride - 1)
+        return True, img
+
+    def skip(self, n):
+        if n <= 0:
+            return
+        if n >= self.seek_min_stride:
+            self.position += n
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.position)
+            return
+        for _ in range(n):
+            if not self.cap.grab():
+                break
+            self.position += 1
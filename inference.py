@@ -0,0 +1,119 @@
+import inspect
+
+import torch
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+from config import DETECTION_CONF, DETECTION_IOU, TRACKER_CONFIG, INFERENCE_BATCH_SIZE
+
+try:
+    from ultralytics.utils import YAML
+
+    def _load_yaml(path):
+        return YAML.load(path)
+except ImportError:
+    # Older ultralytics releases only have the yaml_load function.
+    from ultralytics.utils import yaml_load as _load_yaml
+
+
+def make_tracker(tracker_config=TRACKER_CONFIG, frame_rate=30):
+    cfg = IterableSimpleNamespace(**_load_yaml(check_yaml(tracker_config)))
+    # Newer ultralytics releases dropped the frame_rate argument.
+    if 'frame_rate' in inspect.signature(BYTETracker.__init__).parameters:
+        return BYTETracker(args=cfg, frame_rate=frame_rate)
+    return BYTETracker(args=cfg)
+
+
+class FrameTracker:
+    def __init__(self, model, conf=DETECTION_CONF, iou=DETECTION_IOU, tracker_config=TRACKER_CONFIG):
+        self.model = model
+        self.conf = conf
+        self.iou = iou
+        self.tracker_config = tracker_config
+
+    def __call__(self, imgs):
+        return [
+            list(self.model.track(
+                img,
+                stream=True,
+                tracker=self.tracker_config,
+                persist=True,
+                conf=self.conf,
+                iou=self.iou,
+                verbose=False
+            ))
+            for img in imgs
+        ]
+
+
+class BatchTracker:
+    # Detects a whole batch in one forward pass, then feeds the detections to
+    # its own ByteTrack instance frame by frame, the same way model.track's
+    # postprocess callback does, so ids and crossings match the per-frame path.
+    # With a band (y0, y1) only those rows are sent to the detector; with a
+    # roi.MotionGate, frames without motion reuse the previous detections,
+    # so ByteTrack still sees every frame and keeps its ids.
+    def __init__(self, model, conf=DETECTION_CONF, iou=DETECTION_IOU, tracker_config=TRACKER_CONFIG, imgsz=None,
+                 band=None, gate=None):
+        self.model = model
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.band = band
+        self.gate = gate
+        self.last_det = None
+        self.tracker = make_tracker(tracker_config)
+
+    def detect(self, imgs):
+        if self.imgsz:
+            return self.model.predict(imgs, conf=self.conf, iou=self.iou, imgsz=self.imgsz, verbose=False)
+        return self.model.predict(imgs, conf=self.conf, iou=self.iou, verbose=False)
+
+    def __call__(self, imgs):
+        if self.band is None and self.gate is None:
+            return [[self.track(r)] for r in self.detect(imgs)]
+        return [[self.track(r)] for r in self.detect_prefiltered(imgs)]
+
+    def detect_prefiltered(self, imgs):
+        y0, y1 = self.band if self.band is not None else (0, None)
+        crops = [img[y0:y1] for img in imgs]
+        moving = [self.gate.moving(crop) if self.gate is not None else True for crop in crops]
+        to_detect = [crop for crop, m in zip(crops, moving) if m]
+        detected = iter(self.detect(to_detect) if to_detect else [])
+        results = []
+        for img, m in zip(imgs, moving):
+            if m:
+                r = self.last_det = self.uncrop(next(detected), img, y0)
+            else:
+                r = self.last_det.new()
+                r.orig_img = img
+                r.update(boxes=self.last_det.boxes.data)
+            results.append(r)
+        return results
+
+    def uncrop(self, r, img, y0):
+        data = r.boxes.data.clone()
+        data[:, [1, 3]] += y0
+        r.orig_img = img
+        r.orig_shape = img.shape[:2]
+        r.update(boxes=data)
+        return r
+
+    def track(self, r):
+        det = r.boxes.cpu().numpy()
+        if len(det) == 0:
+            return r
+        tracks = self.tracker.update(det, r.orig_img)
+        if len(tracks) == 0:
+            return r
+        idx = tracks[:, -1].astype(int)
+        r = r[idx]
+        r.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return r
+
+
+def make_infer(model, batch_size=INFERENCE_BATCH_SIZE, band=None, gate=None):
+    if batch_size > 1 or band is not None or gate is not None:
+        return BatchTracker(model, band=band, gate=gate)
+    return FrameTracker(model)
@@ -0,0 +1,47 @@
+import hashlib
+import os
+import tempfile
+
+from config import UPLOAD_DIR, INGEST_CHUNK_SIZE
+
+
+def get_file_hash(file_path):
+    hasher = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        while True:
+            buf = f.read(INGEST_CHUNK_SIZE)
+            if not buf:
+                break
+            hasher.update(buf)
+    return hasher.hexdigest()
+
+
+def ingest_upload(uploaded_file, upload_dir=UPLOAD_DIR, chunk_size=INGEST_CHUNK_SIZE):
+    # Copies the upload in fixed-size chunks and hashes each chunk on the way
+    # through, so the file is read once and never held in memory as a whole.
+    # Stored files are named by their hash; if that file already exists the
+    # fresh copy is dropped and the existing one reused.
+    os.makedirs(upload_dir, exist_ok=True)
+    ext = os.path.splitext(getattr(uploaded_file, 'name', '') or '')[1].lower()
+    hasher = hashlib.md5()
+    fd, part_path = tempfile.mkstemp(dir=upload_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            uploaded_file.seek(0)
+            while True:
+                buf = uploaded_file.read(chunk_size)
+                if not buf:
+                    break
+                hasher.update(buf)
+                out.write(buf)
+        video_hash = hasher.hexdigest()
+        video_path = os.path.join(upload_dir, video_hash + ext)
+        if os.path.exists(video_path):
+            os.remove(part_path)
+        else:
+            os.replace(part_path, video_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return video_path, video_hash
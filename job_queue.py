@@ -0,0 +1,103 @@
+import time
+
+ACTIVE_STATUSES = ('queued', 'running')
+JOB_COLUMNS = ('id', 'user_email', 'video_hash', 'video_path', 'speed', 'status', 'frame_count', 'total_frames',
+               'fps', 'error', 'worker', 'created_at', 'started_at', 'updated_at', 'finished_at')
+
+
+def init_jobs(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT,
+            video_hash TEXT,
+            video_path TEXT,
+            speed INTEGER,
+            status TEXT,
+            frame_count INTEGER DEFAULT 0,
+            total_frames INTEGER,
+            fps REAL,
+            error TEXT,
+            worker TEXT,
+            created_at REAL,
+            started_at REAL,
+            updated_at REAL,
+            finished_at REAL
+        )
+    ''')
+    # Two live jobs for one user and video would write the same progress row.
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active ON jobs (user_email, video_hash)
+        WHERE status IN ('queued', 'running')
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)')
+    conn.commit()
+
+
+def _job(row):
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def load_job(conn, job_id):
+    row = conn.execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE id=?', (job_id,)).fetchone()
+    return _job(row)
+
+
+def latest_job(conn, user_email, video_hash):
+    row = conn.execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE user_email=? AND video_hash=? ORDER BY id DESC LIMIT 1',
+                       (user_email, video_hash)).fetchone()
+    return _job(row)
+
+
+def submit_job(conn, user_email, video_hash, video_path, speed):
+    # Returns the already queued/running job for this video if there is one.
+    now = time.time()
+    conn.execute('INSERT OR IGNORE INTO jobs (user_email, video_hash, video_path, speed, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                 (user_email, video_hash, video_path, speed, 'queued', now, now))
+    conn.commit()
+    row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE user_email=? AND video_hash=? AND status IN ('queued', 'running')",
+                       (user_email, video_hash)).fetchone()
+    return _job(row)
+
+
+def claim_job(conn, worker):
+    # Oldest queued job of the user with the fewest running jobs, so one
+    # user queueing many videos does not hold back everybody else. The single
+    # UPDATE is atomic, so two workers never claim the same job.
+    now = time.time()
+    cur = conn.execute('''
+        UPDATE jobs SET status='running', worker=?, started_at=?, updated_at=?
+        WHERE status='queued' AND id = (
+            SELECT q.id FROM jobs q WHERE q.status='queued'
+            ORDER BY (SELECT COUNT(*) FROM jobs r WHERE r.status='running' AND r.user_email=q.user_email), q.id
+            LIMIT 1
+        )
+    ''', (worker, now, now))
+    conn.commit()
+    if not cur.rowcount:
+        return None
+    row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status='running' AND worker=? ORDER BY started_at DESC LIMIT 1",
+                       (worker,)).fetchone()
+    return _job(row)
+
+
+def update_job(conn, job_id, **fields):
+    fields['updated_at'] = time.time()
+    assignments = ', '.join(f'{name}=?' for name in fields)
+    conn.execute(f'UPDATE jobs SET {assignments} WHERE id=?', (*fields.values(), job_id))
+    conn.commit()
+
+
+def finish_job(conn, job_id, status, error=None):
+    update_job(conn, job_id, status=status, error=error, finished_at=time.time())
+
+
+def requeue_running(conn):
+    # Jobs still marked running when the app starts were cut off by a
+    # restart; they resume from their progress checkpoint.
+    conn.execute("UPDATE jobs SET status='queued', worker=NULL WHERE status='running'")
+    conn.commit()
+
+
+def queue_position(conn, job_id):
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE status='queued' AND id < ?", (job_id,)).fetchone()[0] + 1
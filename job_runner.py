@@ -0,0 +1,211 @@
+import os
+import socket
+import threading
+import time
+
+import cv2
+
+from config import (
+    DB_PATH,
+    MODEL_PATH,
+    ANALYSIS_TARGET_FPS,
+    DETECTION_STORE_ENABLED,
+    ZONES_PATH,
+    ADAPTIVE_TARGET_FPS,
+    JOB_WORKERS,
+    JOB_PROGRESS_SECONDS,
+    JOB_POLL_SECONDS,
+    PREVIEW_MAX_FPS,
+    SCHEDULER_ENABLED,
+    SCHEDULER_JOB_BATCH,
+    INFERENCE_BATCH_SIZE,
+)
+from storage import connect, load_progress, load_config_spans, load_result_key
+from job_queue import submit_job, claim_job, update_job, finish_job, requeue_running
+from checkpoint import CheckpointWriter
+from track_state import TrackState
+from model_registry import session_model
+from frame_sampler import FrameSampler
+from pipeline import Pipeline
+from inference import make_infer
+from adaptive import AdaptiveController, AdaptiveTracker
+from roi import make_prefilter
+from preview import PreviewPolicy
+from result_cache import analysis_params, cache_key, put_cached_result
+from engine import CountingEngine, video_info, counting_line, empty_counter, empty_minute_counter
+from detection_store import DetectionWriter, detection_path, detection_meta, restore_zones
+from zones import ZoneCounter, load_zones
+from metrics import NULL_METRICS, session_metrics, release
+from scheduler import ScheduledTracker, get_scheduler
+
+
+def start_counting(conn, user_email, video_hash, video_path, info, speed, names, result_key, metrics=NULL_METRICS):
+    # Builds the counting engine of one (user, video) analysis with its
+    # progress checkpoint, detection store and zones. info is video_info(cap).
+    # Only an unfinished analysis with the same parameters (result_key) is
+    # resumed; a finished one or one at another speed/model starts over.
+    frame_width, frame_height, fps, total_frames, total_minutes = info
+    frame_count, counter, minute_counter, tracks, status = load_progress(conn, user_email, video_hash, total_minutes)
+    config_spans = load_config_spans(conn, user_email, video_hash) if frame_count else []
+    if status != "analyzing" or load_result_key(conn, user_email, video_hash) != result_key:
+        frame_count, counter, minute_counter, tracks = 0, empty_counter(), empty_minute_counter(total_minutes), TrackState()
+        config_spans = []
+    checkpoint = CheckpointWriter(conn, user_email, video_hash, video_path, frame_count, counter, minute_counter, tracks,
+                                  config_spans=config_spans, metrics=metrics, result_key=result_key)
+    checkpoint.snapshot("analyzing")
+    recorder = None
+    if DETECTION_STORE_ENABLED:
+        recorder = DetectionWriter(
+            detection_path(result_key, user_email),
+            detection_meta(video_hash, names, fps, frame_width, frame_height, total_frames, total_minutes, speed),
+            start_frame=frame_count
+        )
+    zones = None
+    if ZONES_PATH:
+        # Zone counts are not part of the checkpoint; on resume they are
+        # rebuilt from the detection records written so far.
+        zones = ZoneCounter(load_zones(ZONES_PATH, frame_width, frame_height), total_minutes)
+        if frame_count and recorder is not None:
+            restore_zones(recorder.base_path, zones)
+    return CountingEngine(names, counting_line(frame_width, frame_height), fps, total_minutes, counter, minute_counter,
+                          tracks, checkpoint, recorder=recorder, zones=zones)
+
+
+def run_job(conn, job, live=None):
+    # Analyses one claimed job to the end, resuming from the progress
+    # checkpoint. live (a dict) receives the latest preview JPEG, the
+    # detector configuration and the metrics for the page that polls it.
+    live = live if live is not None else {}
+    user_email, video_hash, video_path, speed = job['user_email'], job['video_hash'], job['video_path'], job['speed']
+    params = analysis_params(MODEL_PATH, speed)
+    result_key = cache_key(video_hash, params)
+    model = session_model(MODEL_PATH)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {video_path}")
+    try:
+        info = video_info(cap)
+        frame_width, frame_height, fps, total_frames, total_minutes = info
+        metrics = live['metrics'] = session_metrics(video_hash[:12])
+        engine = start_counting(conn, user_email, video_hash, video_path, info, speed, model.names, result_key, metrics)
+        checkpoint, zones = engine.checkpoint, engine.zones
+        if zones is not None:
+            live['zones'] = zones
+        frame_count = checkpoint.frame_count
+        update_job(conn, job['id'], frame_count=frame_count, total_frames=total_frames, fps=fps)
+        sampler = FrameSampler(cap, stride=speed, target_fps=ANALYSIS_TARGET_FPS, start_frame=frame_count)
+
+        controller = AdaptiveController(ADAPTIVE_TARGET_FPS) if ADAPTIVE_TARGET_FPS else None
+        band, gate = make_prefilter(engine.limits, frame_height)
+        # The page polls every JOB_POLL_SECONDS; previews encoded in between
+        # would never be shown.
+        preview = PreviewPolicy(max_fps=min(PREVIEW_MAX_FPS, 1.0 / JOB_POLL_SECONDS))
+        # Jobs share one detector through the scheduler; the adaptive
+        # controller switches models per job, so it keeps its own.
+        scheduled = None
+        batch_size = INFERENCE_BATCH_SIZE
+        if controller is not None:
+            infer = AdaptiveTracker(controller, band=band, gate=gate)
+        elif SCHEDULER_ENABLED:
+            infer = scheduled = ScheduledTracker(get_scheduler(MODEL_PATH), band=band, gate=gate)
+            batch_size = SCHEDULER_JOB_BATCH
+        else:
+            infer = make_infer(model, batch_size, band=band, gate=gate)
+        pipeline = Pipeline(sampler, infer, prepare=lambda img: cv2.resize(img, (frame_width, frame_height)),
+                            batch_size=batch_size, metrics=metrics)
+
+        start_frame = frame_count
+        last_progress = time.monotonic()
+        try:
+            for frame_count, img, result in pipeline:
+                if controller is not None:
+                    config, result = result
+                # Boxes are only drawn on frames that become a preview.
+                preview_due = preview.due()
+                with metrics.time('postprocess'):
+                    engine.process(frame_count, result, img if preview_due else None)
+                if controller is not None:
+                    checkpoint.record_config(frame_count, *config)
+                    live['config'] = config
+                if preview_due:
+                    with metrics.time('render'):
+                        live['preview'] = preview.encode(img)
+                if time.monotonic() - last_progress >= JOB_PROGRESS_SECONDS:
+                    last_progress = time.monotonic()
+                    update_job(conn, job['id'], frame_count=frame_count)
+                metrics.frame_done()
+        finally:
+            release(metrics)
+            if scheduled is not None:
+                scheduled.close()
+            if engine.recorder is not None:
+                engine.recorder.close()
+
+        checkpoint.close(status="done")
+        if frame_count > start_frame:
+            put_cached_result(conn, result_key, video_hash, params, engine.counter, engine.minute_counter, fps, total_frames,
+                              zones=zones.results() if zones is not None else None)
+        update_job(conn, job['id'], frame_count=frame_count)
+    finally:
+        cap.release()
+
+
+class JobRunner:
+    # Owns the analysis work of the app process: a fixed pool of worker
+    # threads claims queued jobs from the jobs table, so a rerun, a widget
+    # change or a closed tab only stops the page polling, not the analysis,
+    # and no more than `workers` videos compete for the CPU at once.
+    def __init__(self, db_path=DB_PATH, workers=JOB_WORKERS, idle_seconds=JOB_POLL_SECONDS):
+        self.db_path = db_path
+        self.idle_seconds = idle_seconds
+        self.live = {}
+        self.wakeup = threading.Event()
+        conn = connect(db_path)
+        requeue_running(conn)
+        conn.close()
+        self.threads = [
+            threading.Thread(target=self._work, args=(f"{socket.gethostname()}:{os.getpid()}:{i}",), daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, conn, user_email, video_hash, video_path, speed):
+        job = submit_job(conn, user_email, video_hash, video_path, speed)
+        self.wakeup.set()
+        return job
+
+    def live_state(self, job_id):
+        return self.live.get(job_id, {})
+
+    def _work(self, worker):
+        conn = connect(self.db_path)
+        while True:
+            job = claim_job(conn, worker)
+            if job is None:
+                self.wakeup.wait(self.idle_seconds)
+                self.wakeup.clear()
+                continue
+            live = self.live[job['id']] = {}
+            try:
+                run_job(conn, job, live)
+                finish_job(conn, job['id'], 'done')
+            except Exception as e:
+                finish_job(conn, job['id'], 'error', f"{type(e).__name__}: {e}")
+            finally:
+                self.live.pop(job['id'], None)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner(db_path=DB_PATH):
+    # One runner per process, shared by every Streamlit session. Jobs left
+    # running by a previous process are requeued when it starts, so only one
+    # app process should use a database.
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(db_path)
+    return _runner
@@ -0,0 +1,268 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from config import (
+    METRICS_ENABLED,
+    METRICS_WINDOW,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_FILE,
+    METRICS_EXPORT_SECONDS,
+)
+
+# decode: sampler.read() (+ resize); inference: one detector/tracker call
+# per batch; postprocess: engine.process, which includes the checkpoint
+# flushes also reported as persistence; render: preview and widget updates.
+STAGES = ('decode', 'inference', 'postprocess', 'persistence', 'render')
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class _Span:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class StageMetrics:
+    # Hot-path side only appends to bounded deques; percentiles, fps and
+    # gauge callbacks (queue sizes) are evaluated when a snapshot is taken.
+    enabled = True
+
+    def __init__(self, name, window=METRICS_WINDOW):
+        self.name = name
+        self.window = window
+        self.samples = {stage: deque(maxlen=window) for stage in STAGES}
+        self.totals = {stage: [0.0, 0] for stage in STAGES}
+        self.frame_times = deque(maxlen=window)
+        self.frames = 0
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def time(self, stage):
+        return _Span(self, stage)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+                self.totals[stage] = [0.0, 0]
+            self.samples[stage].append(seconds)
+            total = self.totals[stage]
+            total[0] += seconds
+            total[1] += 1
+
+    def frame_done(self):
+        self.frames += 1
+        self.frame_times.append(time.monotonic())
+
+    def watch(self, name, read, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = read
+
+    def fps(self):
+        times = list(self.frame_times)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        # Decays to zero when frames stop coming in.
+        span = max(times[-1], time.monotonic() - 1.0) - times[0]
+        return (len(times) - 1) / span
+
+    def snapshot(self):
+        with self.lock:
+            samples = {stage: np.array(values) for stage, values in self.samples.items()}
+            totals = {stage: tuple(total) for stage, total in self.totals.items()}
+        stages = {}
+        for stage, values in samples.items():
+            stat = {'sum': totals[stage][0], 'count': totals[stage][1]}
+            if len(values):
+                stat['quantiles'] = dict(zip(QUANTILES, np.quantile(values, QUANTILES).tolist()))
+            stages[stage] = stat
+        gauges = {}
+        for key, read in list(self.gauges.items()):
+            try:
+                gauges[key] = float(read())
+            except Exception:
+                continue
+        return {'stages': stages, 'fps': self.fps(), 'frames': self.frames, 'gauges': gauges}
+
+
+class NullMetrics:
+    enabled = False
+
+    def time(self, stage):
+        return _NULL_SPAN
+
+    def observe(self, stage, seconds):
+        pass
+
+    def frame_done(self):
+        pass
+
+    def watch(self, name, read, **labels):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+_registry = {}
+_registry_lock = threading.Lock()
+_session_ids = itertools.count(1)
+_exporter_started = False
+
+
+def session_metrics(name, enabled=METRICS_ENABLED):
+    if not enabled:
+        return NULL_METRICS
+    metrics = StageMetrics(name)
+    with _registry_lock:
+        _registry[next(_session_ids)] = metrics
+    start_exporter()
+    return metrics
+
+
+def release(metrics):
+    with _registry_lock:
+        for key, value in list(_registry.items()):
+            if value is metrics:
+                del _registry[key]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items() if v is not None)
+
+
+def prometheus_text():
+    with _registry_lock:
+        sessions = list(_registry.items())
+    snapshots = [(session, metrics.name, metrics.snapshot()) for session, metrics in sessions]
+    lines = [
+        '# HELP vehicle_stage_seconds Latency of each analysis stage over the last samples.',
+        '# TYPE vehicle_stage_seconds summary',
+    ]
+    for session, name, snap in snapshots:
+        for stage, stat in snap['stages'].items():
+            for q, value in stat.get('quantiles', {}).items():
+                lines.append(f'vehicle_stage_seconds{{{_labels(session=session, video=name, stage=stage, quantile=q)}}} {value:.6f}')
+            lines.append(f'vehicle_stage_seconds_sum{{{_labels(session=session, video=name, stage=stage)}}} {stat["sum"]:.6f}')
+            lines.append(f'vehicle_stage_seconds_count{{{_labels(session=session, video=name, stage=stage)}}} {stat["count"]}')
+    lines += [
+        '# HELP vehicle_processing_fps Analysed frames per second.',
+        '# TYPE vehicle_processing_fps gauge',
+    ]
+    for session, name, snap in snapshots:
+        lines.append(f'vehicle_processing_fps{{{_labels(session=session, video=name)}}} {snap["fps"]:.3f}')
+    lines += [
+        '# HELP vehicle_frames_total Analysed frames.',
+        '# TYPE vehicle_frames_total counter',
+    ]
+    for session, name, snap in snapshots:
+        lines.append(f'vehicle_frames_total{{{_labels(session=session, video=name)}}} {snap["frames"]}')
+    gauge_names = sorted({gauge for _, _, snap in snapshots for gauge, _ in snap['gauges']})
+    for gauge in gauge_names:
+        lines.append(f'# TYPE vehicle_{gauge} gauge')
+        for session, name, snap in snapshots:
+            for (g, labels), value in snap['gauges'].items():
+                if g == gauge:
+                    lines.append(f'vehicle_{gauge}{{{_labels(session=session, video=name, **dict(labels))}}} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(path):
+    # Written next to the target and renamed, so a scraper (e.g. the
+    # node_exporter textfile collector) never reads a half-written file.
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _write_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_textfile(path)
+        except OSError:
+            continue
+
+
+def start_exporter(host=METRICS_HOST, port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_EXPORT_SECONDS):
+    # Once per process; Streamlit sessions and batch threads share it.
+    global _exporter_started
+    with _registry_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+    if port:
+        try:
+            server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError:
+            # Another process (e.g. a batch worker) already serves the port.
+            server = None
+        if server is not None:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+    if path:
+        threading.Thread(target=_write_loop, args=(path, interval), daemon=True).start()
+
+
+def debug_rows(metrics):
+    snap = metrics.snapshot()
+    rows = []
+    for stage, stat in snap['stages'].items():
+        if not stat['count']:
+            continue
+        quantiles = stat['quantiles']
+        rows.append({
+            'Tahap': stage,
+            'p50 (ms)': round(quantiles[0.5] * 1000, 2),
+            'p90 (ms)': round(quantiles[0.9] * 1000, 2),
+            'p99 (ms)': round(quantiles[0.99] * 1000, 2),
+            'Jumlah': stat['count'],
+        })
+    return rows, snap
@@ -0,0 +1,57 @@
+import copy
+import threading
+
+import numpy as np
+from ultralytics import YOLO
+
+from config import MODEL_PATH, MODEL_WARMUP_IMGSZ, INFERENCE_BACKEND
+from backends import resolve_model_path
+
+_models = {}
+_lock = threading.Lock()
+
+
+def warm_up(model, imgsz=MODEL_WARMUP_IMGSZ):
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    model.predict(dummy, verbose=False)
+
+
+def get_shared_model(model_path=MODEL_PATH, backend=INFERENCE_BACKEND):
+    with _lock:
+        model = _models.get((model_path, backend))
+        if model is None:
+            model = YOLO(resolve_model_path(model_path, backend), task='detect')
+            warm_up(model)
+            _models[(model_path, backend)] = model
+    return model
+
+
+def preload_model(model_path=MODEL_PATH, backend=INFERENCE_BACKEND):
+    if (model_path, backend) in _models:
+        return
+    threading.Thread(target=get_shared_model, args=(model_path, backend), daemon=True).start()
+
+
+def _session_predictor(shared, callbacks):
+    # The predictor holds the AutoBackend. For ONNX/OpenVINO YOLO.model is
+    # only the export path, so a new predictor (or even reading model.names
+    # without one) would load the runtime session again. A copy shares the
+    # backend but gets its own callbacks, trackers and inference lock.
+    if shared.predictor is None:
+        return None
+    predictor = copy.copy(shared.predictor)
+    predictor.callbacks = callbacks
+    predictor.__dict__.pop('trackers', None)
+    if hasattr(predictor, '_lock'):
+        predictor._lock = threading.Lock()
+    return predictor
+
+
+def session_model(model_path=MODEL_PATH, backend=INFERENCE_BACKEND):
+    # Shares the loaded, fused weights but gets its own predictor and
+    # callbacks, so ByteTrack state registered by model.track stays per session.
+    shared = get_shared_model(model_path, backend)
+    model = copy.copy(shared)
+    model.callbacks = {event: list(funcs) for event, funcs in shared.callbacks.items()}
+    model.predictor = _session_predictor(shared, model.callbacks)
+    return model
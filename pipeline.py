@@ -0,0 +1,109 @@
+import queue
+import threading
+
+from config import PIPELINE_QUEUE_SIZE, INFERENCE_BATCH_SIZE
+from metrics import NULL_METRICS
+
+_DONE = object()
+
+
+class Pipeline:
+    # decode thread -> inference thread -> caller (render/persist).
+    # A single inference thread keeps frames in order for ByteTrack, and the
+    # bounded queues block the upstream stages when the caller falls behind.
+    # infer takes a list of up to batch_size frames and returns one result
+    # list per frame. Decode and inference are timed into metrics, which also
+    # reports how full both queues are.
+    def __init__(self, sampler, infer, prepare=None, batch_size=INFERENCE_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE,
+                 metrics=NULL_METRICS):
+        self.sampler = sampler
+        self.infer = infer
+        self.prepare = prepare
+        self.batch_size = max(1, batch_size)
+        self.frames = queue.Queue(maxsize=max(queue_size, self.batch_size))
+        self.results = queue.Queue(maxsize=queue_size)
+        self.metrics = metrics
+        metrics.watch('queue_depth', self.frames.qsize, queue='decoded')
+        metrics.watch('queue_depth', self.results.qsize, queue='inferred')
+        self.stop_event = threading.Event()
+        self.error = None
+        self.threads = [
+            threading.Thread(target=self._decode, daemon=True),
+            threading.Thread(target=self._inference, daemon=True),
+        ]
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _decode(self):
+        try:
+            while not self.stop_event.is_set():
+                with self.metrics.time('decode'):
+                    success, img = self.sampler.read()
+                    if success and self.prepare is not None:
+                        img = self.prepare(img)
+                if not success:
+                    break
+                if not self._put(self.frames, (self.sampler.position, img)):
+                    return
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self.frames, _DONE)
+
+    def _inference(self):
+        try:
+            done = False
+            while not done:
+                batch = []
+                while len(batch) < self.batch_size:
+                    item = self._get(self.frames)
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    break
+                with self.metrics.time('inference'):
+                    results = self.infer([img for _, img in batch])
+                for (frame_count, img), result in zip(batch, results):
+                    if not self._put(self.results, (frame_count, img, result)):
+                        return
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self.results, _DONE)
+
+    def __iter__(self):
+        for thread in self.threads:
+            thread.start()
+        try:
+            while True:
+                item = self._get(self.results)
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self.close()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join()
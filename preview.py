@@ -0,0 +1,33 @@
+import time
+
+import cv2
+
+from config import PREVIEW_MAX_FPS, PREVIEW_MAX_WIDTH, PREVIEW_JPEG_QUALITY
+
+
+class PreviewPolicy:
+    # Decides when the live preview is refreshed and shrinks the frame to a
+    # small JPEG before it goes over the websocket, so analysis speed no
+    # longer depends on how fast the browser can take full-size frames.
+    def __init__(self, max_fps=PREVIEW_MAX_FPS, max_width=PREVIEW_MAX_WIDTH, jpeg_quality=PREVIEW_JPEG_QUALITY):
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.last_shown = None
+
+    def due(self):
+        now = time.monotonic()
+        if self.last_shown is not None and now - self.last_shown < self.interval:
+            return False
+        self.last_shown = now
+        return True
+
+    def encode(self, img):
+        h, w = img.shape[:2]
+        if self.max_width and w > self.max_width:
+            scale = self.max_width / w
+            img = cv2.resize(img, (self.max_width, int(h * scale)), interpolation=cv2.INTER_AREA)
+        success, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not success:
+            return None
+        return buf.tobytes()
@@ -0,0 +1,31 @@
+from config import VEHICLE_CLASSES, RECAP_INTERVAL_MINUTES
+from engine import traffic_status
+
+
+class RecapAggregator:
+    # Keeps per-class prefix sums over the finished minutes of minute_counter,
+    # so every recap interval is summed exactly once when it finishes instead
+    # of re-summing the whole video on each update.
+    def __init__(self, total_minutes, interval=RECAP_INTERVAL_MINUTES):
+        self.total_minutes = total_minutes
+        self.interval = interval
+        self.num_intervals = total_minutes // interval
+        self.prefix = [[0] * len(VEHICLE_CLASSES)]
+        self.rows = []
+
+    def update(self, minute_counter, elapsed_seconds):
+        finished = min(int(elapsed_seconds // 60), self.total_minutes)
+        while len(self.prefix) <= finished:
+            row = minute_counter[len(self.prefix) - 1]
+            self.prefix.append([total + row[cls] for total, cls in zip(self.prefix[-1], VEHICLE_CLASSES)])
+        new_rows = []
+        while len(self.rows) < self.num_intervals and (len(self.rows) + 1) * self.interval <= finished:
+            start_min = len(self.rows) * self.interval
+            end_min = start_min + self.interval
+            sums = dict(zip(VEHICLE_CLASSES, (b - a for a, b in zip(self.prefix[start_min], self.prefix[end_min]))))
+            jumlah = sum(sums.values())
+            row = dict(menit=f"{start_min+1}-{end_min}", end_min=end_min, jumlah=jumlah,
+                       status=traffic_status(jumlah, self.interval), **sums)
+            self.rows.append(row)
+            new_rows.append(row)
+        return new_rows
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import time
+
+from config import (
+    DETECTION_CONF,
+    DETECTION_IOU,
+    TRACKER_CONFIG,
+    COUNTING_LINE_RATIO,
+    ZONES_PATH,
+    INFERENCE_BACKEND,
+    ADAPTIVE_TARGET_FPS,
+    ROI_ENABLED,
+    ROI_BAND_ABOVE,
+    ROI_BAND_BELOW,
+    MOTION_GATING,
+    MOTION_PIXEL_THRESHOLD,
+    MOTION_MIN_AREA,
+    MOTION_REFRESH_FRAMES,
+    ANALYSIS_TARGET_FPS,
+    RESULT_CACHE_MAX_BYTES,
+)
+
+
+def init_cache(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS result_cache (
+            cache_key TEXT PRIMARY KEY,
+            video_hash TEXT,
+            params_json TEXT,
+            counter_json TEXT,
+            minute_counter_json TEXT,
+            fps REAL,
+            total_frames INTEGER,
+            size_bytes INTEGER,
+            last_access REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_access ON result_cache (last_access)')
+    conn.commit()
+
+
+def model_fingerprint(model_path):
+    if os.path.exists(model_path):
+        stat = os.stat(model_path)
+        return f"{os.path.basename(model_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    return os.path.basename(model_path)
+
+
+def analysis_params(model_path, speed, target_fps=ANALYSIS_TARGET_FPS, conf=DETECTION_CONF, iou=DETECTION_IOU,
+                    line_ratio=COUNTING_LINE_RATIO, tracker_config=TRACKER_CONFIG, zones_path=ZONES_PATH,
+                    backend=INFERENCE_BACKEND, adaptive_fps=ADAPTIVE_TARGET_FPS):
+    params = {
+        'model': model_fingerprint(model_path),
+        'conf': conf,
+        'iou': iou,
+        'speed': speed,
+        'target_fps': target_fps,
+        'line': line_ratio,
+        'tracker': tracker_config,
+    }
+    if backend != 'torch':
+        params['backend'] = backend
+    if adaptive_fps:
+        params['adaptive_fps'] = adaptive_fps
+    if ROI_ENABLED:
+        params['roi'] = [ROI_BAND_ABOVE, ROI_BAND_BELOW]
+    if MOTION_GATING:
+        params['motion'] = [MOTION_PIXEL_THRESHOLD, MOTION_MIN_AREA, MOTION_REFRESH_FRAMES]
+    if zones_path:
+        with open(zones_path) as f:
+            params['zones'] = json.load(f)
+    return params
+
+
+def cache_key(video_hash, params):
+    payload = json.dumps([video_hash, params], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def get_cached_result(conn, key):
+    # zones is None when the result was stored without zone counts.
+    row = conn.execute('SELECT counter_json, minute_counter_json, fps, total_frames, zones_json FROM result_cache WHERE cache_key=?', (key,)).fetchone()
+    if row is None:
+        return None
+    conn.execute('UPDATE result_cache SET last_access=? WHERE cache_key=?', (time.time(), key))
+    conn.commit()
+    return json.loads(row[0]), json.loads(row[1]), row[2], row[3], json.loads(row[4]) if row[4] else None
+
+
+def put_cached_result(conn, key, video_hash, params, counter, minute_counter, fps, total_frames, zones=None,
+                      max_bytes=RESULT_CACHE_MAX_BYTES):
+    params_json = json.dumps(params, sort_keys=True)
+    counter_json = json.dumps(counter)
+    minute_counter_json = json.dumps(minute_counter)
+    zones_json = json.dumps(zones) if zones is not None else None
+    size_bytes = len(params_json) + len(counter_json) + len(minute_counter_json) + len(zones_json or '')
+    conn.execute('INSERT OR REPLACE INTO result_cache (cache_key, video_hash, params_json, counter_json, minute_counter_json, fps, total_frames, zones_json, size_bytes, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (key, video_hash, params_json, counter_json, minute_counter_json, fps, total_frames, zones_json, size_bytes, time.time())
+    )
+    evict(conn, max_bytes)
+    conn.commit()
+
+
+def evict(conn, max_bytes=RESULT_CACHE_MAX_BYTES):
+    # Evicted entries take their detection stores with them; the stores are
+    # also capped on their own, since they are far larger than the rows.
+    from detection_store import remove_detections, prune_detections
+
+    total = conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM result_cache').fetchone()[0]
+    if total > max_bytes:
+        rows = conn.execute('SELECT cache_key, size_bytes FROM result_cache ORDER BY last_access').fetchall()
+        for key, size_bytes in rows:
+            if total <= max_bytes:
+                break
+            conn.execute('DELETE FROM result_cache WHERE cache_key=?', (key,))
+            remove_detections(key)
+            total -= size_bytes
+    prune_detections()
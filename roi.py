@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+
+from config import (
+    ROI_ENABLED,
+    ROI_BAND_ABOVE,
+    ROI_BAND_BELOW,
+    MOTION_GATING,
+    MOTION_PIXEL_THRESHOLD,
+    MOTION_MIN_AREA,
+    MOTION_REFRESH_FRAMES,
+    MOTION_SAMPLE_WIDTH,
+)
+
+
+def roi_band(line_y, frame_height, above=ROI_BAND_ABOVE, below=ROI_BAND_BELOW):
+    # Rows [y0, y1) around the counting line. The part above the line has to
+    # be tall enough for a vehicle to be tracked before it reaches the line.
+    y0 = max(0, int(line_y - above * frame_height))
+    y1 = min(frame_height, int(line_y + below * frame_height))
+    return y0, y1
+
+
+class MotionGate:
+    # Cheap frame differencing on a small grey copy of the (cropped) frame.
+    # Each frame is compared with the last frame that went to detection, not
+    # with its neighbour, so slow or small movement adds up until it crosses
+    # the threshold. moving() is also True after refresh_frames skipped
+    # frames in a row, which bounds how long the tracker goes without fresh
+    # detections.
+    def __init__(self, pixel_threshold=MOTION_PIXEL_THRESHOLD, min_area=MOTION_MIN_AREA,
+                 refresh_frames=MOTION_REFRESH_FRAMES, sample_width=MOTION_SAMPLE_WIDTH):
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.refresh_frames = refresh_frames
+        self.sample_width = sample_width
+        self.prev = None
+        self.static_run = 0
+        self.skipped = 0
+
+    def moving(self, img):
+        h, w = img.shape[:2]
+        if w > self.sample_width:
+            img = cv2.resize(img, (self.sample_width, max(1, h * self.sample_width // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        ref = self.prev
+        if ref is None or ref.shape != gray.shape or self.static_run >= self.refresh_frames:
+            self.prev = gray
+            self.static_run = 0
+            return True
+        changed = np.count_nonzero(cv2.absdiff(gray, ref) > self.pixel_threshold)
+        if changed >= self.min_area * gray.size:
+            self.prev = gray
+            self.static_run = 0
+            return True
+        self.static_run += 1
+        self.skipped += 1
+        return False
+
+
+def make_prefilter(limits, frame_height, roi=ROI_ENABLED, motion=MOTION_GATING):
+    band = roi_band(limits[1], frame_height) if roi else None
+    gate = MotionGate() if motion else None
+    return band, gate
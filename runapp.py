@@ -1,105 +1,162 @@
 import streamlit as st
 import cv2
-import cvzone
-import numpy as np
-from ultralytics import YOLO
-import tempfile
 import math
 import os
+import time
 import matplotlib.pyplot as plt
-import sqlite3
-import json
-import hashlib
-
-MODEL_PATH = 'yolov8m.pt'
-VEHICLE_CLASSES = ['bicycle', 'motorcycle', 'car', 'bus', 'truck']
-VEHICLE_COLORS = {
-    'car': ((70, 130, 180), (100, 180, 255)),
-    'motorcycle': ((0, 191, 255), (100, 255, 255)),
-    'bus': ((0, 102, 204), (0, 180, 255)),
-    'truck': ((0, 153, 255), (100, 200, 255)),
-    'bicycle': ((0, 102, 255), (100, 180, 255))
-}
-LIMITS = [100, 600, 1550, 600]
-speed_factors = [1, 2, 4, 6, 8]
-MAX_FILE_SIZE_MB = 1024
-
-def get_file_hash(file_path):
-    hasher = hashlib.md5()
-    with open(file_path, 'rb') as f:
-        while True:
-            buf = f.read(65536)
-            if not buf:
-                break
-            hasher.update(buf)
-    return hasher.hexdigest()
+import pandas as pd
+
+from config import MODEL_PATH, VEHICLE_CLASSES, speed_factors, MAX_FILE_SIZE_MB, ZONES_PATH, METRICS_ENABLED, METRICS_DEBUG_PANEL, JOB_POLL_SECONDS
+from storage import get_connection, load_last_progress, load_progress, save_progress
+from ingest import ingest_upload
+from track_state import TrackState
+from model_registry import preload_model
+from result_cache import analysis_params, cache_key, get_cached_result, put_cached_result
+from engine import video_info, empty_counter
+from detection_store import detection_path, recount
+from recap import RecapAggregator
+from metrics import debug_rows
+from job_queue import ACTIVE_STATUSES, latest_job, load_job, queue_position
+from job_runner import get_runner
+
+conn = get_connection()
+preload_model(MODEL_PATH)
+
+def render_counts(count_placeholder, elapsed_seconds, counter):
+    minutes = int(elapsed_seconds // 60)
+    seconds = int(elapsed_seconds % 60)
+    with count_placeholder:
+        st.markdown(
+            """
+            <div class="jumlah-kendaraan-scroll">
+                <div class="jumlah-kendaraan-grid">
+                    <div class="label-jumlah">Durasi</div>
+                    <div class="label-jumlah">Sepeda</div>
+                    <div class="label-jumlah">Motor</div>
+                    <div class="label-jumlah">Mobil</div>
+                    <div class="label-jumlah">Bus</div>
+                    <div class="label-jumlah">Truk</div>
+                </div>
+                <div class="jumlah-kendaraan-grid">
+                    <div class="isi-jumlah">{}</div>
+                    <div class="isi-jumlah">{}</div>
+                    <div class="isi-jumlah">{}</div>
+                    <div class="isi-jumlah">{}</div>
+                    <div class="isi-jumlah">{}</div>
+                    <div class="isi-jumlah">{}</div>
+                </div>
+            </div>
+            """.format(
+                f"{minutes:02d}:{seconds:02d}",
+                counter['bicycle'],
+                counter['motorcycle'],
+                counter['car'],
+                counter['bus'],
+                counter['truck']
+            ),
+            unsafe_allow_html=True
+        )
 
-conn = sqlite3.connect('analisis_kendaraan.db')
-c = conn.cursor()
-c.execute('''
-    CREATE TABLE IF NOT EXISTS progress (
-        id INTEGER PRIMARY KEY,
-        user_email TEXT,
-        video_hash TEXT,
-        video_path TEXT,
-        frame_count INTEGER,
-        counter_json TEXT,
-        minute_counter_json TEXT,
-        prev_y2_dict_json TEXT,
-        totalcounts_json TEXT,
-        status TEXT,
-        last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+def render_zones(zone_placeholder, zone_counters):
+    html_table = '<div class="tabelku"><table>'
+    html_table += (
+        "<tr>"
+        "<th>Zona</th><th>Sepeda</th><th>Motor</th><th>Mobil</th><th>Bus</th><th>Truk</th><th>Jumlah</th></tr>"
     )
-''')
-conn.commit()
-try:
-    c.execute("ALTER TABLE progress ADD COLUMN user_email TEXT")
-    conn.commit()
-except sqlite3.OperationalError:
-    pass
-
-def load_last_progress(user_email):
-    c.execute("SELECT video_hash, video_path, status FROM progress WHERE user_email=? ORDER BY last_update DESC LIMIT 1", (user_email,))
-    row = c.fetchone()
-    if row:
-        return row[0], row[1], row[2]
-    return None, None, None
-
-def load_progress(user_email, video_hash, total_minutes):
-    c.execute('SELECT frame_count, counter_json, minute_counter_json, prev_y2_dict_json, totalcounts_json, status FROM progress WHERE user_email=? AND video_hash=?', (user_email, video_hash))
-    row = c.fetchone()
-    if row:
-        frame_count = row[0]
-        counter = json.loads(row[1])
-        minute_counter = json.loads(row[2])
-        prev_y2_dict = json.loads(row[3])
-        totalcounts = json.loads(row[4])
-        status = row[5] if len(row) > 5 else "uploaded"
-        if len(minute_counter) < total_minutes:
-            for _ in range(total_minutes - len(minute_counter)):
-                minute_counter.append({cls: 0 for cls in VEHICLE_CLASSES})
-        elif len(minute_counter) > total_minutes:
-            minute_counter = minute_counter[:total_minutes]
-        return frame_count, counter, minute_counter, prev_y2_dict, totalcounts, status
-    else:
-        return 0, {cls: 0 for cls in VEHICLE_CLASSES}, [{cls: 0 for cls in VEHICLE_CLASSES} for _ in range(total_minutes)], {}, [], "uploaded"
-
-def save_progress(user_email, video_hash, video_path, frame_count, counter, minute_counter, prev_y2_dict, totalcounts, status="analyzing"):
-    c.execute('DELETE FROM progress WHERE user_email=? AND video_hash=?', (user_email, video_hash))
-    c.execute('INSERT INTO progress (user_email, video_hash, video_path, frame_count, counter_json, minute_counter_json, prev_y2_dict_json, totalcounts_json, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-        (
-            user_email,
-            video_hash,
-            video_path,
-            frame_count,
-            json.dumps(counter),
-            json.dumps(minute_counter),
-            json.dumps(prev_y2_dict),
-            json.dumps(totalcounts),
-            status
+    for name, zone_counter in zone_counters.items():
+        html_table += f"<tr><td>{name}</td>"
+        for cls in VEHICLE_CLASSES:
+            html_table += f"<td>{zone_counter[cls]}</td>"
+        html_table += f"<td>{sum(zone_counter.values())}</td></tr>"
+    html_table += "</table></div>"
+    zone_placeholder.markdown(html_table, unsafe_allow_html=True)
+
+def render_metrics(metrics_placeholder, metrics):
+    rows, snap = debug_rows(metrics)
+    queues = ", ".join(f"{dict(labels)['queue']}: {value:g}" for (name, labels), value in snap['gauges'].items() if name == 'queue_depth')
+    with metrics_placeholder.container():
+        st.caption(f"{snap['fps']:.1f} frame/detik · {snap['frames']} frame · antrian {queues}")
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+def render_recap(stframe_table, stframe_bar, recap, minute_counter, elapsed_seconds, view=None):
+    # view keeps the HTML of the finished rows and the chart between polls:
+    # nothing is sent until an interval finishes, and then only the new rows
+    # are built and added to the chart.
+    new_rows = recap.update(minute_counter, elapsed_seconds)
+    if view is not None and not new_rows:
+        return view
+    if view is None:
+        view = {'rows_html': [], 'chart': None}
+
+    for row in new_rows:
+        view['rows_html'].append(
+            f"<tr>"
+            f"<td>{row['menit']}</td>"
+            f"<td>{row['bicycle']}</td>"
+            f"<td>{row['motorcycle']}</td>"
+            f"<td>{row['car']}</td>"
+            f"<td>{row['bus']}</td>"
+            f"<td>{row['truck']}</td>"
+            f"<td>{row['jumlah']}</td>"
+            f"<td class='status-{row['status'].lower()}'>{row['status']}</td>"
+            f"</tr>"
+        )
+    html_table = '<div class="tabelku"><table>'
+    html_table += (
+        "<tr>"
+        "<th>Menit</th><th>Sepeda</th><th>Motor</th><th>Mobil</th><th>Bus</th><th>Truk</th>"
+        "<th>Jumlah</th><th>Keterangan</th></tr>"
+    )
+    html_table += ''.join(view['rows_html'])
+    for idx in range(len(recap.rows), recap.num_intervals):
+        menit_label = f"{idx * recap.interval + 1}-{(idx + 1) * recap.interval}"
+        html_table += (
+            f"<tr><td>{menit_label}</td><td>-</td><td>-</td><td>-</td><td>-</td><td>-</td><td>-</td><td>-</td></tr>"
         )
+    html_table += "</table></div>"
+    stframe_table.markdown(html_table, unsafe_allow_html=True)
+
+    # Native chart: later intervals are appended with add_rows instead of
+    # drawing a new figure.
+    if not new_rows:
+        return view
+    data = pd.DataFrame(
+        [[row[cls] for cls in VEHICLE_CLASSES] for row in new_rows],
+        columns=['Sepeda', 'Motor', 'Mobil', 'Bus', 'Truk'],
+        index=pd.Index([row['end_min'] for row in new_rows], name="Menit ke-")
     )
-    conn.commit()
+    if view['chart'] is None:
+        view['chart'] = stframe_bar.bar_chart(data)
+    else:
+        view['chart'].add_rows(data)
+    return view
+
+def render_growth_chart(minute_counter, total_minutes):
+    x_pos = [i+1 for i in range(total_minutes)]
+    jumlah_list = [sum(minute_counter[i].values()) for i in range(total_minutes)]
+    warna_list = []
+    for jumlah in jumlah_list:
+        if jumlah > 80:
+            warna_list.append("#d32f2f")
+        elif jumlah < 60:
+            warna_list.append("#388e3c")
+        else:
+            warna_list.append("#fbc02d")
+    fig_line, ax_line = plt.subplots(figsize=(10, 3))
+    for i in range(len(jumlah_list)-1):
+        ax_line.plot(x_pos[i:i+2], jumlah_list[i:i+2], color=warna_list[i], linewidth=2, marker='o')
+    ax_line.scatter(x_pos, jumlah_list, color=warna_list, s=80, zorder=5)
+    ax_line.set_xlabel("Menit ke-")
+    ax_line.set_ylabel("Jumlah Kendaraan")
+    ax_line.set_title("Grafik Pertumbuhan Jumlah Kendaraan")
+    ax_line.set_xticks(x_pos)
+    y_max = ((max(jumlah_list) // 10) + 1) * 10 if max(jumlah_list) > 0 else 10
+    ax_line.set_ylim(0, y_max)
+    ax_line.set_yticks(range(0, y_max + 1, 10))
+    for x, y, warna in zip(x_pos, jumlah_list, warna_list):
+        ax_line.text(x, y, str(y), ha='center', va='bottom', fontsize=10, color=warna)
+    st.pyplot(fig_line)
 
 st.markdown("""
     <style>
@@ -468,18 +525,19 @@ if uploaded_file is not None:
         st.error(f"Ukuran file terlalu besar ({file_size_mb:.1f} MB). Maksimal {MAX_FILE_SIZE_MB} MB.")
         st.stop()
     st.success(f"File berhasil diupload ({file_size_mb:.1f} MB).")
-    tfile = tempfile.NamedTemporaryFile(delete=False)
-    tfile.write(uploaded_file.read())
-    video_path = tfile.name
-    video_hash = get_file_hash(tfile.name)
-    st.session_state['video_path'] = video_path
-    st.session_state['video_hash'] = video_hash
-    st.session_state['status'] = "uploaded"
+    upload_id = (getattr(uploaded_file, 'file_id', None) or uploaded_file.name, uploaded_file.size)
+    if st.session_state.get('upload_id') != upload_id or not st.session_state['video_path']:
+        video_path, video_hash = ingest_upload(uploaded_file)
+        st.session_state['upload_id'] = upload_id
+        st.session_state['video_path'] = video_path
+        st.session_state['video_hash'] = video_hash
+        st.session_state['status'] = "uploaded"
+        save_progress(conn, user_email, video_hash, video_path, 0, empty_counter(), [], TrackState(), status="uploaded")
+    video_path = st.session_state['video_path']
     st.video(video_path)
-    save_progress(user_email, video_hash, video_path, 0, {cls: 0 for cls in VEHICLE_CLASSES}, [], {}, [], status="uploaded")
 else:
     if not st.session_state['video_path'] or not st.session_state['video_hash']:
-        last_hash, last_path, last_status = load_last_progress(user_email)
+        last_hash, last_path, last_status = load_last_progress(conn, user_email)
         if last_hash and last_path and os.path.exists(last_path):
             st.session_state['video_path'] = last_path
             st.session_state['video_hash'] = last_hash
@@ -511,13 +569,20 @@ with col2:
 
 st.markdown("</div>", unsafe_allow_html=True)
 
-frame_count, counter, minute_counter, prev_y2_dict, totalcounts, status = load_progress(user_email, st.session_state['video_hash'], 1)
-auto_run_analysis = status in ("analyzing", "done")
-if status == "uploaded" and not run_analysis:
+frame_count, counter, minute_counter, tracks, status = load_progress(conn, user_email, st.session_state['video_hash'], 1)
+runner = get_runner()
+job = latest_job(conn, user_email, st.session_state['video_hash'])
+job_active = job is not None and job['status'] in ACTIVE_STATUSES
+auto_run_analysis = status in ("analyzing", "done") or job_active
+if status == "uploaded" and not run_analysis and not job_active:
     st.info("Video sudah diupload. Silakan klik 'Mulai Analisis' untuk memulai analisis.")
 
 if run_analysis or auto_run_analysis:
-    st.warning("Video sedang diproses, mohon tunggu hingga selesai...")
+    params = analysis_params(MODEL_PATH, speed)
+    result_key = cache_key(st.session_state['video_hash'], params)
+    cached = get_cached_result(conn, result_key)
+    if cached is None:
+        st.warning("Video sedang diproses, mohon tunggu hingga selesai...")
 
     with st.container():
         st.markdown(
@@ -529,260 +594,116 @@ if run_analysis or auto_run_analysis:
             unsafe_allow_html=True
         )
 
-        model = YOLO(MODEL_PATH)
-        cap = cv2.VideoCapture(st.session_state['video_path'])
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        if fps <= 0:
-            fps = 30
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration_seconds = total_frames / fps
-        duration_minutes = duration_seconds / 60
-        total_minutes = int(duration_seconds // 60)
-        if duration_seconds % 60 > 0:
-            total_minutes += 1
-
-        LIMITS = [
-            0,                      
-            int(0.8 * frame_height),
-            frame_width,            
-            int(0.8 * frame_height) 
-        ]
-
-        frame_count, counter, minute_counter, prev_y2_dict, totalcounts, _ = load_progress(user_email, st.session_state['video_hash'], total_minutes)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count)
-
-        stframe = st.empty()
-        st.markdown("### Jumlah Kendaraan Terdeteksi")
-        count_placeholder = st.empty()
-        st.markdown('<div style="margin-top:28px"></div>', unsafe_allow_html=True)
-        st.markdown("### Rekapitulasi Setiap Menit")
-        stframe_table = st.empty()
-        stframe_bar = st.empty()
-        progress_bar = st.progress(0)
-
-        last_bar_update_minute = -1
-
-        while True:
-            success, img = cap.read()
-            if not success:
-                break
-
-            for _ in range(speed - 1):
-                cap.read()
-                frame_count += 1
-            frame_count += 1
-
-            img = cv2.resize(img, (frame_width, frame_height))
-            result = model.track(
-                img,
-                stream=True,
-                tracker="bytetrack.yaml",
-                persist=True,
-                conf=0.3,
-                iou=0.5
-            )
-
-            elapsed_seconds = frame_count / fps
-            elapsed_minutes = elapsed_seconds / 60
-            current_minute = int(elapsed_minutes)
-            if current_minute >= total_minutes:
-                current_minute = total_minutes - 1
-
-            for r in result:
-                boxes = r.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    w, h = x2 - x1, y2 - y1
-                    bbox = x1, y1, w, h
-                    cls = int(box.cls[0])
-                    
-                    id_val = getattr(box, "id", None)
-                    if id_val is None:
-                        continue
-                    
-                    try:
-                        id = int(id_val[0]) if hasattr(id_val, "__getitem__") else int(id_val)
-                    except Exception:
-                        continue
-                    if 0 <= cls < len(model.names):
-                        currentClass = model.names[cls]
-                    else:
-                        continue
-                    if currentClass in VEHICLE_COLORS:
-                        color, _ = VEHICLE_COLORS[currentClass]
-                        cvzone.cornerRect(img, bbox, l=9, rt=5, colorC=color)
-                        cv2.line(img, (LIMITS[0], LIMITS[1]), (LIMITS[2], LIMITS[3]), (25, 118, 210), 5)
-                        garis_y = LIMITS[1]
-                        prev_y2 = prev_y2_dict.get(str(id), y2)
-                        
-                        if prev_y2 < garis_y and y2 >= garis_y:
-                            if id not in totalcounts:
-                                totalcounts.append(id)
-                                counter[currentClass] += 1
-                                minute_counter[current_minute][currentClass] += 1
-                                cv2.line(img, (LIMITS[0], LIMITS[1]), (LIMITS[2], LIMITS[3]), (255, 255, 255), 5)
-                                cv2.circle(img, (x1 + w // 2, y1 + h // 2), 10, (25, 118, 210), cv2.FILLED)
-                        prev_y2_dict[str(id)] = y2
-
-            save_progress(user_email, st.session_state['video_hash'], st.session_state['video_path'], frame_count, counter, minute_counter, prev_y2_dict, totalcounts, status="analyzing")
-
-            minutes = int(elapsed_seconds // 60)
-            seconds = int(elapsed_seconds % 60)
-
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            stframe.image(img_rgb, channels="RGB")
-
-            with count_placeholder:
-                st.markdown(
-                    """
-                    <div class="jumlah-kendaraan-scroll">
-                        <div class="jumlah-kendaraan-grid">
-                            <div class="label-jumlah">Durasi</div>
-                            <div class="label-jumlah">Sepeda</div>
-                            <div class="label-jumlah">Motor</div>
-                            <div class="label-jumlah">Mobil</div>
-                            <div class="label-jumlah">Bus</div>
-                            <div class="label-jumlah">Truk</div>
-                        </div>
-                        <div class="jumlah-kendaraan-grid">
-                            <div class="isi-jumlah">{}</div>
-                            <div class="isi-jumlah">{}</div>
-                            <div class="isi-jumlah">{}</div>
-                            <div class="isi-jumlah">{}</div>
-                            <div class="isi-jumlah">{}</div>
-                            <div class="isi-jumlah">{}</div>
-                        </div>
-                    </div>
-                    """.format(
-                        f"{minutes:02d}:{seconds:02d}",
-                        counter['bicycle'],
-                        counter['motorcycle'],
-                        counter['car'],
-                        counter['bus'],
-                        counter['truck']
-                    ),
-                    unsafe_allow_html=True
-                )
-
-            if current_minute != last_bar_update_minute:
-                last_bar_update_minute = current_minute
-
-                interval = 5
-                num_intervals = total_minutes // interval
-
-                html_table = '<div class="tabelku"><table>'
-                html_table += (
-                    "<tr>"
-                    "<th>Menit</th><th>Sepeda</th><th>Motor</th><th>Mobil</th><th>Bus</th><th>Truk</th>"
-                    "<th>Jumlah</th><th>Keterangan</th></tr>"
-                )
-                bar_labels = []
-                bar_data = {k: [] for k in VEHICLE_CLASSES}
-                bar_jumlah = []
-
-                for idx in range(num_intervals):
-                    start_min = idx * interval
-                    end_min = (idx + 1) * interval
-                    menit_label = f"{start_min+1}-{end_min}"
-                    if elapsed_seconds >= (idx + 1) * interval * 60:
-                        row_sum = {cls: 0 for cls in VEHICLE_CLASSES}
-                        for m in range(start_min, end_min):
-                            for cls in VEHICLE_CLASSES:
-                                row_sum[cls] += minute_counter[m][cls]
-                        jumlah = sum(row_sum.values())
-                        if jumlah > 600 * (end_min - start_min):
-                            status_str = "Macet"
-                            status_class = "status-macet"
-                        elif jumlah < 400 * (end_min - start_min):
-                            status_str = "Lancar"
-                            status_class = "status-lancar"
-                        else:
-                            status_str = "Sedang"
-                            status_class = "status-sedang"
-                        html_table += (
-                            f"<tr>"
-                            f"<td>{menit_label}</td>"
-                            f"<td>{row_sum['bicycle']}</td>"
-                            f"<td>{row_sum['motorcycle']}</td>"
-                            f"<td>{row_sum['car']}</td>"
-                            f"<td>{row_sum['bus']}</td>"
-                            f"<td>{row_sum['truck']}</td>"
-                            f"<td>{jumlah}</td>"
-                            f"<td class='{status_class}'>{status_str}</td>"
-                            f"</tr>"
-                        )
-                        bar_labels.append(menit_label)
-                        for k in VEHICLE_CLASSES:
-                            bar_data[k].append(row_sum[k])
-                        bar_jumlah.append(jumlah)
-                    else:
-                        html_table += (
-                            f"<tr><td>{menit_label}</td><td>-</td><td>-</td><td>-</td><td>-</td><td>-</td><td>-</td><td>-</td></tr>"
-                        )
-                html_table += "</table></div>"
-                stframe_table.markdown(html_table, unsafe_allow_html=True)
-                st.markdown('<div style="margin-bottom:40px;"></div>', unsafe_allow_html=True)
-
-                kendaraan_labels = ['Sepeda', 'Motor', 'Mobil', 'Bus', 'Truk']
-                kendaraan_keys = ['bicycle', 'motorcycle', 'car', 'bus', 'truck']
-                kendaraan_colors = ['#1976d2', '#64b5f6', '#90caf9', '#1565c0', '#42a5f5']
-                bar_x = np.arange(len(bar_labels))
-                fig_bar, ax_bar = plt.subplots(figsize=(10, 5))
-                width = 0.15
-                for idx_k, (k, color, label) in enumerate(zip(kendaraan_keys, kendaraan_colors, kendaraan_labels)):
-                    data = bar_data[k]
-                    x_pos = bar_x + (idx_k - 2) * width
-                    ax_bar.bar(x_pos, data, width=width, label=label, color=color)
-                ax_bar.set_xlabel("Menit ke-", fontsize=13)
-                ax_bar.set_ylabel("Jumlah", fontsize=13)
-                ax_bar.set_title("\n\nJumlah Kendaraan per Jenis per 5 Menit", fontsize=15, color="#1976d2", pad=24)
-                ax_bar.set_xticks(bar_x)
-                ax_bar.set_xticklabels(bar_labels)
-                y_max = 10
-                if len(bar_jumlah) > 0:
-                    y_max = ((max(bar_jumlah) // 10) + 1) * 10
-                ax_bar.set_ylim(0, y_max)
-                ax_bar.set_yticks(range(0, y_max + 1, 10))
-                ax_bar.legend(loc='upper right', fontsize=12)
-                ax_bar.grid(axis='y', linestyle='--', alpha=0.4)
-                stframe_bar.pyplot(fig_bar)
-                plt.close(fig_bar)
-
-            if (frame_count >= total_frames):
-                x_pos = [i+1 for i in range(total_minutes)]
-                jumlah_list = [sum(minute_counter[i].values()) for i in range(total_minutes)]
-                warna_list = []
-                for jumlah in jumlah_list:
-                    if jumlah > 80:
-                        warna_list.append("#d32f2f")
-                    elif jumlah < 60:
-                        warna_list.append("#388e3c")
-                    else:
-                        warna_list.append("#fbc02d")
-                fig_line, ax_line = plt.subplots(figsize=(10, 3))
-                for i in range(len(jumlah_list)-1):
-                    ax_line.plot(x_pos[i:i+2], jumlah_list[i:i+2], color=warna_list[i], linewidth=2, marker='o')
-                ax_line.scatter(x_pos, jumlah_list, color=warna_list, s=80, zorder=5)
-                ax_line.set_xlabel("Menit ke-")
-                ax_line.set_ylabel("Jumlah Kendaraan")
-                ax_line.set_title("Grafik Pertumbuhan Jumlah Kendaraan")
-                ax_line.set_xticks(x_pos)
-                y_max = ((max(jumlah_list) // 10) + 1) * 10 if max(jumlah_list) > 0 else 10
-                ax_line.set_ylim(0, y_max)
-                ax_line.set_yticks(range(0, y_max + 1, 10))
-                for x, y, warna in zip(x_pos, jumlah_list, warna_list):
-                    ax_line.text(x, y, str(y), ha='center', va='bottom', fontsize=10, color=warna)
-                st.pyplot(fig_line)
-
-            progress = min(frame_count / total_frames, 1.0)
-            progress_bar.progress(progress)
-
-        cap.release()
-
-        save_progress(user_email, st.session_state['video_hash'], st.session_state['video_path'], frame_count, counter, minute_counter, prev_y2_dict, totalcounts, status="done")
-        st.success("Analisis selesai!")
+        if cached is not None:
+            counter, minute_counter, fps, total_frames, zone_results = cached
+            total_minutes = len(minute_counter)
+            st.markdown("### Jumlah Kendaraan Terdeteksi")
+            render_counts(st.empty(), total_frames / fps, counter)
+            detections = detection_path(result_key, user_email)
+            if ZONES_PATH and zone_results is None and os.path.exists(detections + '.json'):
+                # Results cached before zone counts were stored: recount once
+                # from the detection store and keep the zones with the result.
+                zone_results = recount(detections, zones_path=ZONES_PATH)['zones']
+                put_cached_result(conn, result_key, st.session_state['video_hash'], params, counter, minute_counter,
+                                  fps, total_frames, zones=zone_results)
+            if ZONES_PATH and zone_results is not None:
+                st.markdown("### Jumlah Kendaraan per Zona")
+                render_zones(st.empty(), {name: z['counter'] for name, z in zone_results.items()})
+            st.markdown('<div style="margin-top:28px"></div>', unsafe_allow_html=True)
+            st.markdown("### Rekapitulasi Setiap Menit")
+            stframe_table = st.empty()
+            st.markdown('<div style="margin-bottom:40px;"></div>', unsafe_allow_html=True)
+            render_recap(stframe_table, st.empty(), RecapAggregator(total_minutes), minute_counter, total_frames / fps)
+            render_growth_chart(minute_counter, total_minutes)
+            if status != "done":
+                save_progress(conn, user_email, st.session_state['video_hash'], st.session_state['video_path'],
+                              total_frames, counter, minute_counter, TrackState(), status="done", result_key=result_key)
+            st.success("Analisis selesai!")
+        elif job is not None and job['status'] == 'error' and not run_analysis:
+            st.error(f"Analisis gagal: {job['error']}. Klik 'Mulai Analisis' untuk mencoba lagi.")
+        else:
+            # The analysis itself runs in a job_runner worker; this page only
+            # polls its progress, so a rerun or a closed tab does not stop it.
+            if not job_active and (run_analysis or status != "done"):
+                job = runner.submit(conn, user_email, st.session_state['video_hash'], st.session_state['video_path'], speed)
+            cap = cv2.VideoCapture(st.session_state['video_path'])
+            frame_width, frame_height, fps, total_frames, total_minutes = video_info(cap)
+            cap.release()
+
+            stframe = st.empty()
+            job_caption = st.empty()
+            show_metrics = METRICS_ENABLED and METRICS_DEBUG_PANEL
+            if show_metrics:
+                with st.expander("Debug: waktu per tahap", expanded=False):
+                    metrics_placeholder = st.empty()
+            st.markdown("### Jumlah Kendaraan Terdeteksi")
+            count_placeholder = st.empty()
+            if ZONES_PATH:
+                st.markdown("### Jumlah Kendaraan per Zona")
+                zone_placeholder = st.empty()
+            st.markdown('<div style="margin-top:28px"></div>', unsafe_allow_html=True)
+            st.markdown("### Rekapitulasi Setiap Menit")
+            stframe_table = st.empty()
+            st.markdown('<div style="margin-bottom:40px;"></div>', unsafe_allow_html=True)
+            stframe_bar = st.empty()
+            progress_bar = st.progress(0)
+
+            recap = RecapAggregator(total_minutes)
+            recap_view = None
+            # What the page shows now; a poll only sends what changed.
+            shown = {}
+            while True:
+                if job is not None:
+                    job = load_job(conn, job['id'])
+                frame_count, counter, minute_counter, _, _ = load_progress(conn, user_email, st.session_state['video_hash'], total_minutes)
+                elapsed_seconds = frame_count / fps
+                live = runner.live_state(job['id']) if job is not None else {}
+
+                caption = None
+                if job is not None and job['status'] == 'queued':
+                    caption = f"Menunggu giliran analisis (antrian ke-{queue_position(conn, job['id'])})"
+                elif 'config' in live:
+                    model_name, imgsz = live['config']
+                    caption = f"Model: {model_name} @ {imgsz}px"
+                if caption is not None and caption != shown.get('caption'):
+                    job_caption.caption(caption)
+                    shown['caption'] = caption
+                preview = live.get('preview')
+                if preview is not None and preview is not shown.get('preview'):
+                    stframe.image(preview)
+                    shown['preview'] = preview
+                if show_metrics and 'metrics' in live:
+                    render_metrics(metrics_placeholder, live['metrics'])
+
+                counts = (int(elapsed_seconds), tuple(counter.values()))
+                if counts != shown.get('counts'):
+                    render_counts(count_placeholder, elapsed_seconds, counter)
+                    shown['counts'] = counts
+                if 'zones' in live:
+                    zone_counts = {name: dict(zone_counter) for name, zone_counter in live['zones'].counters.items()}
+                    if zone_counts != shown.get('zones'):
+                        render_zones(zone_placeholder, zone_counts)
+                        shown['zones'] = zone_counts
+                recap_view = render_recap(stframe_table, stframe_bar, recap, minute_counter, elapsed_seconds, recap_view)
+                percent = min(int(frame_count * 100 / total_frames), 100)
+                if percent != shown.get('percent'):
+                    progress_bar.progress(percent)
+                    shown['percent'] = percent
+
+                if job is None or job['status'] not in ACTIVE_STATUSES:
+                    break
+                time.sleep(JOB_POLL_SECONDS)
+
+            job_caption.empty()
+            if job is not None and job['status'] == 'error':
+                st.error(f"Analisis gagal: {job['error']}")
+            else:
+                job_speed = job['speed'] if job is not None else speed
+                finished = get_cached_result(conn, cache_key(st.session_state['video_hash'], analysis_params(MODEL_PATH, job_speed)))
+                if ZONES_PATH and finished is not None and finished[4] is not None:
+                    render_zones(zone_placeholder, {name: z['counter'] for name, z in finished[4].items()})
+                render_growth_chart(minute_counter, total_minutes)
+                st.success("Analisis selesai!")
 
         st.markdown("</div>", unsafe_allow_html=True)
-st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+
+from config import (
+    MODEL_PATH,
+    DETECTION_CONF,
+    DETECTION_IOU,
+    TRACKER_CONFIG,
+    SCHEDULER_MAX_BATCH,
+    SCHEDULER_MAX_WAIT,
+    SCHEDULER_TIMEOUT,
+)
+from model_registry import session_model
+from inference import BatchTracker
+
+
+class _Request:
+    __slots__ = ('imgs', 'results', 'error', 'done')
+
+    def __init__(self, imgs):
+        self.imgs = imgs
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SchedulerSession:
+    def __init__(self, weight=1):
+        self.weight = weight
+        self.pending = deque()
+        self.deficit = 0
+
+
+class InferenceScheduler:
+    # One dispatcher thread runs the detector for every session. Sessions
+    # queue their frames and block until their results are back. Each forward
+    # pass is filled by deficit round robin: every turn a session earns
+    # `weight` frames of credit, and the session that goes first rotates, so
+    # a session with a big backlog cannot starve the others and a weight-2
+    # session gets twice the frames of a weight-1 one.
+    def __init__(self, model, max_batch=SCHEDULER_MAX_BATCH, max_wait=SCHEDULER_MAX_WAIT,
+                 conf=DETECTION_CONF, iou=DETECTION_IOU, timeout=SCHEDULER_TIMEOUT):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.conf = conf
+        self.iou = iou
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.sessions = []
+        self.picked = []
+        self.turn = 0
+        self.batches = 0
+        self.frames = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def register(self, weight=1):
+        session = SchedulerSession(weight)
+        with self.cond:
+            self.sessions.append(session)
+            self.cond.notify()
+        return session
+
+    def unregister(self, session):
+        with self.cond:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            self.cond.notify()
+
+    def detect(self, session, imgs):
+        request = _Request(imgs)
+        with self.cond:
+            session.pending.append(request)
+            self.cond.notify()
+        if not request.done.wait(self.timeout):
+            with self.cond:
+                if request in session.pending:
+                    session.pending.remove(request)
+            raise TimeoutError(f"Inference did not finish within {self.timeout:g} s")
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _pending_frames(self):
+        return sum(len(r.imgs) for s in self.sessions for r in s.pending)
+
+    def _collect(self):
+        while not any(s.pending for s in self.sessions):
+            self.cond.wait()
+        # While some registered sessions have nothing queued (they are
+        # decoding or counting), wait briefly so one pass can serve them too.
+        deadline = time.monotonic() + self.max_wait
+        while self._pending_frames() < self.max_batch and not all(s.pending for s in self.sessions):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.cond.wait(remaining)
+        return self._pick()
+
+    def _pick(self):
+        n = len(self.sessions)
+        order = self.sessions[self.turn:] + self.sessions[:self.turn]
+        self.turn = (self.turn + 1) % n if n else 0
+        for s in order:
+            if not s.pending:
+                s.deficit = 0
+        batch = self.picked = []
+        size = 0
+        while True:
+            # A request bigger than max_batch only goes into an empty batch.
+            candidates = [s for s in order if s.pending and (not batch or size + len(s.pending[0].imgs) <= self.max_batch)]
+            if not candidates:
+                break
+            for s in candidates:
+                s.deficit += s.weight
+                while s.pending and len(s.pending[0].imgs) <= s.deficit and (not batch or size + len(s.pending[0].imgs) <= self.max_batch):
+                    request = s.pending.popleft()
+                    s.deficit -= len(request.imgs)
+                    batch.append(request)
+                    size += len(request.imgs)
+        return batch
+
+    def _run(self):
+        # Any error goes to the requests it hit instead of ending the thread;
+        # if picking the pass failed, every queued request gets it.
+        while True:
+            batch = None
+            try:
+                with self.cond:
+                    batch = self._collect()
+                imgs = [img for request in batch for img in request.imgs]
+                results = self.model.predict(imgs, conf=self.conf, iou=self.iou, verbose=False)
+                self.batches += 1
+                self.frames += len(imgs)
+                start = 0
+                for request in batch:
+                    request.results = results[start:start + len(request.imgs)]
+                    start += len(request.imgs)
+                    request.done.set()
+            except Exception as e:
+                if batch is None:
+                    with self.cond:
+                        batch = self.picked + [r for s in self.sessions for r in s.pending]
+                        for s in self.sessions:
+                            s.pending.clear()
+                for request in batch:
+                    if not request.done.is_set():
+                        request.error = e
+                        request.done.set()
+
+
+class ScheduledTracker(BatchTracker):
+    # Session side of the scheduler: the ROI band, the motion gate and the
+    # ByteTrack instance stay with the session; only detection is shared.
+    def __init__(self, scheduler, weight=1, tracker_config=TRACKER_CONFIG, band=None, gate=None):
+        super().__init__(scheduler.model, scheduler.conf, scheduler.iou, tracker_config, band=band, gate=gate)
+        self.scheduler = scheduler
+        self.session = scheduler.register(weight)
+
+    def detect(self, imgs):
+        return self.scheduler.detect(self.session, imgs)
+
+    def close(self):
+        self.scheduler.unregister(self.session)
+
+
+_schedulers = {}
+_lock = threading.Lock()
+
+
+def get_scheduler(model_path=MODEL_PATH):
+    with _lock:
+        scheduler = _schedulers.get(model_path)
+        if scheduler is None:
+            scheduler = _schedulers[model_path] = InferenceScheduler(session_model(model_path))
+    return scheduler
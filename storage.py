@@ -0,0 +1,150 @@
+import json
+import sqlite3
+import threading
+
+from config import DB_PATH, VEHICLE_CLASSES
+from checkpoint import init_journal, write_snapshot, replay_deltas
+from track_state import TrackState
+from result_cache import init_cache
+from job_queue import init_jobs
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _add_column(conn, table, column, decl):
+    if column not in _columns(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+
+def _create_progress(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS progress (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT,
+            video_hash TEXT,
+            video_path TEXT,
+            frame_count INTEGER,
+            counter_json TEXT,
+            minute_counter_json TEXT,
+            prev_y2_dict_json TEXT,
+            totalcounts_json TEXT,
+            status TEXT,
+            last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Databases from before per-user progress have no user_email column.
+    _add_column(conn, 'progress', 'user_email', 'TEXT')
+
+
+def _unique_progress(conn):
+    # Older code could leave several rows per video; keep the newest one.
+    conn.execute('''
+        DELETE FROM progress WHERE id NOT IN (
+            SELECT MAX(id) FROM progress GROUP BY user_email, video_hash
+        )
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_progress_video ON progress (user_email, video_hash)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_progress_last_update ON progress (user_email, last_update)')
+
+
+# Applied in order; PRAGMA user_version records how many have run. Every step
+# also has to be safe on databases created before versioning existed.
+MIGRATIONS = [
+    _create_progress,
+    init_journal,
+    init_cache,
+    lambda conn: _add_column(conn, 'progress', 'config_spans_json', 'TEXT'),
+    _unique_progress,
+    init_jobs,
+    lambda conn: _add_column(conn, 'result_cache', 'zones_json', 'TEXT'),
+    lambda conn: _add_column(conn, 'progress', 'result_key', 'TEXT'),
+]
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+_local = threading.local()
+
+
+def migrate(conn):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            step(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+
+
+def connect(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with _migrate_lock:
+        if db_path not in _migrated:
+            migrate(conn)
+            _migrated.add(db_path)
+    return conn
+
+
+def get_connection(db_path=DB_PATH):
+    # One connection per thread and database, since sqlite3 connections must
+    # not be shared between threads. Streamlit runs every rerun on a new
+    # thread, so the page opens one connection per rerun and reuses it for
+    # every query of that run; migrations only run on the first connect.
+    # The connection is closed when its thread ends.
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = connect(db_path)
+    return conn
+
+
+def load_last_progress(conn, user_email):
+    row = conn.execute("SELECT video_hash, video_path, status FROM progress WHERE user_email=? ORDER BY last_update DESC LIMIT 1", (user_email,)).fetchone()
+    if row:
+        return row[0], row[1], row[2]
+    return None, None, None
+
+
+def load_progress(conn, user_email, video_hash, total_minutes):
+    row = conn.execute('SELECT frame_count, counter_json, minute_counter_json, prev_y2_dict_json, totalcounts_json, status FROM progress WHERE user_email=? AND video_hash=?', (user_email, video_hash)).fetchone()
+    if row:
+        frame_count = row[0]
+        counter = json.loads(row[1])
+        minute_counter = json.loads(row[2])
+        tracks = TrackState.from_json(json.loads(row[3]), json.loads(row[4]))
+        status = row[5] if len(row) > 5 else "uploaded"
+        frame_count = replay_deltas(conn, user_email, video_hash, frame_count, counter, minute_counter, tracks)
+        if len(minute_counter) < total_minutes:
+            for _ in range(total_minutes - len(minute_counter)):
+                minute_counter.append({cls: 0 for cls in VEHICLE_CLASSES})
+        elif len(minute_counter) > total_minutes:
+            minute_counter = minute_counter[:total_minutes]
+        return frame_count, counter, minute_counter, tracks, status
+    else:
+        return 0, {cls: 0 for cls in VEHICLE_CLASSES}, [{cls: 0 for cls in VEHICLE_CLASSES} for _ in range(total_minutes)], TrackState(), "uploaded"
+
+
+def load_config_spans(conn, user_email, video_hash):
+    row = conn.execute('SELECT config_spans_json FROM progress WHERE user_email=? AND video_hash=?', (user_email, video_hash)).fetchone()
+    if row and row[0]:
+        return json.loads(row[0])
+    return []
+
+
+def load_result_key(conn, user_email, video_hash):
+    row = conn.execute('SELECT result_key FROM progress WHERE user_email=? AND video_hash=?', (user_email, video_hash)).fetchone()
+    return row[0] if row else None
+
+
+def save_progress(conn, user_email, video_hash, video_path, frame_count, counter, minute_counter, tracks, status="analyzing",
+                  result_key=None):
+    write_snapshot(conn, user_email, video_hash, video_path, frame_count, counter, minute_counter, tracks, status,
+                   result_key=result_key)
+
+
+def load_analyzing(conn, user_email):
+    rows = conn.execute("SELECT video_hash, video_path FROM progress WHERE user_email=? AND status='analyzing' ORDER BY last_update", (user_email,))
+    return [(row[0], row[1]) for row in rows]
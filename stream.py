@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import cv2
+
+from config import MODEL_PATH, LIVE_WINDOW_MINUTES, LIVE_LATENCY_BUDGET, LIVE_RECONNECT_SECONDS, COUNTING_LINE_RATIO
+from model_registry import session_model
+from inference import make_infer
+from engine import CountingEngine, counting_line, empty_counter
+
+
+def open_source(source):
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source)
+
+
+class LatestFrame:
+    # Reads the source on its own thread and keeps only the newest frame, so
+    # a slow consumer skips frames instead of building a backlog in the
+    # decoder buffer. A local file is paced at its native fps so it behaves
+    # like a camera; cameras and network streams are reopened when they drop.
+    def __init__(self, source, reconnect_seconds=LIVE_RECONNECT_SECONDS):
+        self.source = source
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.reconnect_seconds = reconnect_seconds
+        self.cap = open_source(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open stream: {source}")
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.timestamp = None
+        self.closed = False
+        self.ended = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        next_due = time.monotonic()
+        try:
+            while not self.closed:
+                success, img = self.cap.read()
+                if not success:
+                    if self.is_file:
+                        break
+                    self.cap.release()
+                    time.sleep(self.reconnect_seconds)
+                    self.cap = open_source(self.source)
+                    continue
+                if self.is_file:
+                    next_due += interval
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                with self.cond:
+                    self.seq += 1
+                    self.frame = img
+                    self.timestamp = time.time()
+                    self.cond.notify_all()
+        finally:
+            self.cap.release()
+            with self.cond:
+                self.ended = True
+                self.cond.notify_all()
+
+    def read(self, last_seq, timeout=None):
+        # Returns None when the reader ended or was closed, or when no new
+        # frame arrived within timeout (a dead camera keeps reconnecting).
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.cond:
+            while self.seq == last_seq and not self.ended and not self.closed:
+                if deadline is None:
+                    self.cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            if self.seq == last_seq:
+                return None
+            return self.seq, self.timestamp, self.frame
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join(timeout=self.reconnect_seconds + 5)
+
+
+class RollingMinuteCounter:
+    # Stand-in for the pre-sized minute_counter list when the stream has no
+    # known length: indexed by absolute (epoch) minute, keeping only the last
+    # `window` minutes.
+    def __init__(self, window=LIVE_WINDOW_MINUTES):
+        self.window = window
+        self.minutes = OrderedDict()
+
+    def __getitem__(self, minute):
+        row = self.minutes.get(minute)
+        if row is None:
+            row = self.minutes[minute] = empty_counter()
+            while self.minutes and next(iter(self.minutes)) <= minute - self.window:
+                self.minutes.popitem(last=False)
+        return row
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def items(self):
+        return list(self.minutes.items())
+
+
+class LiveCountingEngine(CountingEngine):
+    # Crossings are binned by the wall-clock minute the frame was captured
+    # in, since dropped frames make frame_count useless as a clock.
+    def __init__(self, names, limits, fps, window=LIVE_WINDOW_MINUTES, **kwargs):
+        super().__init__(names, limits, fps, None, minute_counter=RollingMinuteCounter(window), **kwargs)
+        self.captured_at = time.time()
+
+    def minute_of(self, frame_count):
+        return int(self.captured_at // 60)
+
+
+def minute_label(minute):
+    return datetime.fromtimestamp(minute * 60).strftime('%Y-%m-%d %H:%M')
+
+
+def run_stream(source, model_path=MODEL_PATH, window=LIVE_WINDOW_MINUTES, latency_budget=LIVE_LATENCY_BUDGET,
+               line_ratio=COUNTING_LINE_RATIO, duration=None, on_minute=None):
+    # Processes the newest frame each time inference is free. Frames already
+    # older than latency_budget when they reach the detector are dropped, and
+    # each finished minute is passed to on_minute(minute, counter, stats).
+    model = session_model(model_path)
+    infer = make_infer(model, 1)
+    reader = LatestFrame(source)
+    engine = LiveCountingEngine(model.names, counting_line(reader.frame_width, reader.frame_height, line_ratio),
+                                reader.fps, window)
+    started = time.time()
+    seq = 0
+    current = None
+    stats = None
+    try:
+        while duration is None or time.time() - started < duration:
+            # Bounded wait so duration is still checked while the source
+            # delivers nothing.
+            item = reader.read(seq, latency_budget)
+            if item is None:
+                if reader.ended or reader.closed:
+                    break
+                continue
+            new_seq, captured_at, img = item
+            skipped = new_seq - seq - 1
+            seq = new_seq
+            minute = int(captured_at // 60)
+            if minute != current:
+                if current is not None and on_minute is not None:
+                    on_minute(current, engine.minute_counter[current], stats)
+                current = minute
+                stats = {'frames': 0, 'dropped': 0, 'max_latency': 0.0}
+            stats['dropped'] += skipped
+            if time.time() - captured_at > latency_budget:
+                stats['dropped'] += 1
+                continue
+            engine.captured_at = captured_at
+            engine.process(seq, infer([img])[0])
+            stats['frames'] += 1
+            stats['max_latency'] = max(stats['max_latency'], time.time() - captured_at)
+        if current is not None and on_minute is not None:
+            on_minute(current, engine.minute_counter[current], stats)
+    finally:
+        reader.close()
+    return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count vehicles on a live RTSP/HTTP stream or webcam")
+    parser.add_argument('source', help="stream URL, webcam index, or a video file played back in real time")
+    parser.add_argument('--window', type=int, default=LIVE_WINDOW_MINUTES, help="minutes of per-minute counts kept")
+    parser.add_argument('--latency-budget', type=float, default=LIVE_LATENCY_BUDGET,
+                        help="seconds after which a captured frame is dropped instead of analysed")
+    parser.add_argument('--line-ratio', type=float, default=COUNTING_LINE_RATIO)
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('-o', '--output', help="append one JSON line per finished minute (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, 'a') if args.output else sys.stdout
+
+    def on_minute(minute, counter, stats):
+        out.write(json.dumps({'minute': minute_label(minute), 'counter': counter,
+                              'total': sum(counter.values()), **stats}) + '\n')
+        out.flush()
+
+    try:
+        run_stream(args.source, args.model, args.window, args.latency_budget, args.line_ratio, args.duration, on_minute)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
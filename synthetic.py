@@ -0,0 +1,166 @@
+import argparse
+import json
+import math
+import os
+import random
+
+import cv2
+import numpy as np
+
+from config import COUNTING_LINE_RATIO
+from engine import empty_counter, empty_minute_counter, frame_minute
+
+# COCO ids/names, so the engine's class handling is the same as with YOLO.
+SYNTHETIC_NAMES = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane', 5: 'bus', 6: 'train', 7: 'truck'}
+# Flat BGR colour and (width, height) as a fraction of the frame per class.
+SYNTHETIC_VEHICLES = {
+    1: ((220, 40, 220), (0.025, 0.06)),
+    2: ((40, 40, 220), (0.06, 0.09)),
+    3: ((40, 220, 40), (0.03, 0.06)),
+    5: ((220, 40, 40), (0.08, 0.16)),
+    7: ((40, 220, 220), (0.08, 0.14)),
+}
+COLOR_TOLERANCE = 45
+ROAD_COLOR = (90, 90, 90)
+# Largest share of its own height a vehicle may move between two sampled
+# frames. Beyond that ByteTrack loses the overlap between the boxes and
+# starts new tracks, which then miss the line crossing.
+MAX_STEP = 0.25
+
+
+def plan_vehicles(width, height, fps, seconds, vehicles_per_minute, seed=0, max_stride=1):
+    # Vehicles drive top to bottom in fixed lanes. Every vehicle in a lane
+    # has that lane's speed and spawns far enough behind the previous one
+    # that rectangles never overlap. Lanes cross the frame in 3-6 s unless
+    # that moves the smallest vehicle more than MAX_STEP of its height per
+    # max_stride frames; then all lanes are slowed by the same factor.
+    rng = random.Random(seed)
+    lane_width = max(size[0] for _, size in SYNTHETIC_VEHICLES.values()) * width * 1.5
+    lanes = max(1, int(width // lane_width))
+    interval = 60.0 / vehicles_per_minute
+    min_height = min(size[1] for _, size in SYNTHETIC_VEHICLES.values()) * height
+    scale = min(1.0, MAX_STEP * min_height * fps / max_stride / (height / 3.0))
+    lane_speeds = [scale * height / rng.uniform(3.0, 6.0) for _ in range(lanes)]
+    lane_free = [0.0] * lanes
+    vehicles = []
+    t = 0.0
+    while t < seconds:
+        lane = rng.randrange(lanes)
+        cls = rng.choice(list(SYNTHETIC_VEHICLES))
+        w = int(SYNTHETIC_VEHICLES[cls][1][0] * width)
+        h = int(SYNTHETIC_VEHICLES[cls][1][1] * height)
+        speed = lane_speeds[lane]
+        start = max(t, lane_free[lane])
+        lane_free[lane] = start + (h + 0.1 * height) / speed
+        x = int(lane * lane_width + (lane_width - w) / 2)
+        vehicles.append({'cls': cls, 'x': x, 'w': w, 'h': h, 'start': start, 'speed': speed})
+        t += rng.expovariate(1.0 / interval)
+    return vehicles
+
+
+def vehicle_box(vehicle, t):
+    y1 = int(-vehicle['h'] + vehicle['speed'] * (t - vehicle['start']))
+    return vehicle['x'], y1, vehicle['x'] + vehicle['w'], y1 + vehicle['h']
+
+
+def ground_truth(vehicles, height, fps, total_frames, total_minutes, line_ratio=COUNTING_LINE_RATIO, stride=1):
+    # Expected counts for a run with FrameSampler(stride): a crossing shows up
+    # on the first sampled frame at or past it, and needs an earlier sampled
+    # frame with the vehicle still above the line.
+    line_y = int(height * line_ratio)
+    counter = empty_counter()
+    minute_counter = empty_minute_counter(total_minutes)
+    for vehicle in vehicles:
+        frame = max(0, int((vehicle['start'] + line_y / vehicle['speed']) * fps) - 2)
+        while vehicle_box(vehicle, frame / fps)[3] < line_y:
+            frame += 1
+        sampled = -(-frame // stride) * stride
+        if sampled == 0 or sampled >= total_frames:
+            continue
+        name = SYNTHETIC_NAMES[vehicle['cls']]
+        counter[name] += 1
+        # FrameSampler reports the position after the frame and its skipped gap.
+        minute_counter[frame_minute(sampled + stride, fps, total_minutes)][name] += 1
+    return counter, minute_counter
+
+
+def generate_video(path, width=1280, height=720, fps=30, seconds=60, vehicles_per_minute=30, seed=0, max_stride=1):
+    vehicles = plan_vehicles(width, height, fps, seconds, vehicles_per_minute, seed, max_stride)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    background = np.full((height, width, 3), ROAD_COLOR, dtype=np.uint8)
+    total_frames = int(seconds * fps)
+    try:
+        for frame in range(total_frames):
+            t = frame / fps
+            img = background.copy()
+            for vehicle in vehicles:
+                x1, y1, x2, y2 = vehicle_box(vehicle, t)
+                if y2 <= 0 or y1 >= height:
+                    continue
+                # Filled rectangles include both corners; this makes the
+                # detected bounding box exactly (x1, y1, x2, y2).
+                cv2.rectangle(img, (x1, max(0, y1)), (x2 - 1, min(height, y2) - 1), SYNTHETIC_VEHICLES[vehicle['cls']][0], cv2.FILLED)
+            writer.write(img)
+    finally:
+        writer.release()
+    return vehicles
+
+
+class ContourDetector:
+    # Stand-in for YOLO on synthetic videos: finds the flat-coloured
+    # rectangles and reports them as detections of their class, so tracking,
+    # counting and persistence can be checked against exact ground truth.
+    names = SYNTHETIC_NAMES
+
+    def __init__(self, tolerance=COLOR_TOLERANCE):
+        self.ranges = [
+            (cls, np.clip(np.array(color) - tolerance, 0, 255).astype(np.uint8),
+             np.clip(np.array(color) + tolerance, 0, 255).astype(np.uint8))
+            for cls, (color, _) in SYNTHETIC_VEHICLES.items()
+        ]
+
+    def detect_boxes(self, img):
+        boxes = []
+        for cls, lo, hi in self.ranges:
+            mask = cv2.inRange(img, lo, hi)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            for contour in contours:
+                x, y, w, h = cv2.boundingRect(contour)
+                if w * h >= 16:
+                    boxes.append([x, y, x + w, y + h, 0.9, cls])
+        return np.array(boxes, dtype=np.float32).reshape(-1, 6)
+
+    def predict(self, imgs, **kwargs):
+        import torch
+        from ultralytics.engine.results import Results
+
+        return [
+            Results(orig_img=img, path='', names=self.names, boxes=torch.as_tensor(self.detect_boxes(img)))
+            for img in imgs
+        ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic traffic video and print its ground-truth counts")
+    parser.add_argument('output')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--vehicles-per-minute', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-stride', type=int, default=1, help="largest analysis speed the video must still count exactly at")
+    args = parser.parse_args(argv)
+
+    vehicles = generate_video(args.output, args.width, args.height, args.fps, args.seconds, args.vehicles_per_minute,
+                              args.seed, args.max_stride)
+    total_frames = int(args.seconds * args.fps)
+    counter, minute_counter = ground_truth(vehicles, args.height, args.fps, total_frames, math.ceil(args.seconds / 60))
+    print(json.dumps({'vehicles': len(vehicles), 'counter': counter, 'minute_counter': minute_counter}))
+
+
+if __name__ == '__main__':
+    main()
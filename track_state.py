@@ -0,0 +1,79 @@
+from array import array
+
+from config import TRACK_MAX_AGE
+
+
+class TrackState:
+    # Last bottom-edge position per live track id, stored in flat int arrays
+    # indexed through a slot table. Tracks not updated for max_age processed
+    # frames (ByteTrack has long dropped them by then) are evicted together
+    # with their counted flag, so memory follows the number of live tracks.
+    def __init__(self, max_age=TRACK_MAX_AGE):
+        self.max_age = max_age
+        self.counted = set()
+        self.slots = {}
+        self.free = []
+        self.y2 = array('l')
+        self.last_seen = array('l')
+        self.frame = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get_y2(self, track_id, default=None):
+        slot = self.slots.get(track_id)
+        if slot is None:
+            return default
+        return self.y2[slot]
+
+    def get_y2_many(self, track_ids, defaults):
+        slots = self.slots
+        y2 = self.y2
+        return [default if slot is None else y2[slot]
+                for slot, default in zip(map(slots.get, track_ids), defaults)]
+
+    def update(self, track_id, y2):
+        slot = self.slots.get(track_id)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+            else:
+                slot = len(self.y2)
+                self.y2.append(0)
+                self.last_seen.append(0)
+            self.slots[track_id] = slot
+        self.y2[slot] = y2
+        self.last_seen[slot] = self.frame
+
+    def update_many(self, track_ids, y2s):
+        for track_id, y2 in zip(track_ids, y2s):
+            self.update(track_id, y2)
+
+    def is_counted(self, track_id):
+        return track_id in self.counted
+
+    def mark_counted(self, track_id):
+        if track_id in self.counted:
+            return False
+        self.counted.add(track_id)
+        return True
+
+    def end_frame(self):
+        self.frame += 1
+        cutoff = self.frame - self.max_age
+        stale = [tid for tid, slot in self.slots.items() if self.last_seen[slot] < cutoff]
+        for tid in stale:
+            self.free.append(self.slots.pop(tid))
+            self.counted.discard(tid)
+
+    def to_json(self):
+        positions = {str(tid): self.y2[slot] for tid, slot in self.slots.items()}
+        return positions, sorted(self.counted)
+
+    @classmethod
+    def from_json(cls, prev_y2_dict, totalcounts, max_age=TRACK_MAX_AGE):
+        state = cls(max_age=max_age)
+        for tid, y2 in prev_y2_dict.items():
+            state.update(int(tid), int(y2))
+        state.counted.update(tid for tid in map(int, totalcounts) if tid in state.slots)
+        return state
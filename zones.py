@@ -0,0 +1,187 @@
+import json
+
+import cv2
+import numpy as np
+
+from config import TRACK_MAX_AGE
+from engine import empty_counter, empty_minute_counter
+
+ZONE_COLOR = (0, 200, 120)
+
+
+class LineZone:
+    # Counting segment from p1 to p2. A track's reference point (bottom
+    # centre of its box) moving across the segment is 'forward' when it goes
+    # from the left-hand side of p1->p2 to the right-hand side, which for a
+    # left-to-right horizontal line is downwards, like the main counting line.
+    kind = 'line'
+
+    def __init__(self, name, p1, p2, direction='both'):
+        if direction not in ('forward', 'backward', 'both'):
+            raise ValueError(f"Unknown line direction: {direction}")
+        self.name = name
+        self.direction = direction
+        self.a = np.asarray(p1, dtype=float)
+        self.b = np.asarray(p2, dtype=float)
+        self.d = self.b - self.a
+        length2 = float(self.d @ self.d)
+        if not length2:
+            raise ValueError(f"Zone {name!r} has zero length")
+        self.inv_length2 = 1.0 / length2
+
+    def side(self, points):
+        rel = points - self.a
+        return self.d[0] * rel[:, 1] - self.d[1] * rel[:, 0]
+
+    def hits(self, prev, cur):
+        s_prev = self.side(prev)
+        s_cur = self.side(cur)
+        forward = (s_prev < 0) & (s_cur >= 0)
+        backward = (s_prev >= 0) & (s_cur < 0)
+        if self.direction == 'forward':
+            crossed = forward
+        elif self.direction == 'backward':
+            crossed = backward
+        else:
+            crossed = forward | backward
+        if not crossed.any():
+            return crossed
+        denom = np.where(crossed, s_prev - s_cur, 1.0)
+        t = np.where(crossed, s_prev / denom, 0.0)
+        x = prev + t[:, None] * (cur - prev)
+        u = ((x - self.a) @ self.d) * self.inv_length2
+        return crossed & (u >= 0) & (u <= 1)
+
+    def draw(self, img):
+        cv2.line(img, tuple(map(int, self.a)), tuple(map(int, self.b)), ZONE_COLOR, 3)
+
+
+class PolygonZone:
+    # Counts tracks whose reference point enters ('in'), leaves ('out') or
+    # does either ('both') of the polygon.
+    kind = 'polygon'
+
+    def __init__(self, name, points, direction='in'):
+        if direction not in ('in', 'out', 'both'):
+            raise ValueError(f"Unknown polygon direction: {direction}")
+        pts = np.asarray(points, dtype=float)
+        if len(pts) < 3:
+            raise ValueError(f"Zone {name!r} needs at least 3 points")
+        self.name = name
+        self.direction = direction
+        self.points = pts
+        nxt = np.roll(pts, -1, axis=0)
+        self.x0, self.y0 = pts[:, 0], pts[:, 1]
+        self.y1 = nxt[:, 1]
+        dy = self.y1 - self.y0
+        self.slope = np.divide(nxt[:, 0] - self.x0, dy, out=np.zeros_like(dy), where=dy != 0)
+
+    def contains(self, points):
+        # Even-odd ray casting against every edge at once.
+        px = points[:, 0:1]
+        py = points[:, 1:2]
+        straddle = (self.y0 > py) != (self.y1 > py)
+        x_cross = self.x0 + (py - self.y0) * self.slope
+        return (straddle & (px < x_cross)).sum(axis=1) % 2 == 1
+
+    def hits(self, prev, cur):
+        was_in = self.contains(prev)
+        is_in = self.contains(cur)
+        if self.direction == 'in':
+            return ~was_in & is_in
+        if self.direction == 'out':
+            return was_in & ~is_in
+        return was_in != is_in
+
+    def draw(self, img):
+        cv2.polylines(img, [self.points.astype(np.int32)], True, ZONE_COLOR, 2)
+
+
+def make_zone(spec, frame_width=None, frame_height=None):
+    points = spec['points']
+    if spec.get('relative'):
+        points = [(x * frame_width, y * frame_height) for x, y in points]
+    kind = spec.get('type', 'line')
+    if kind == 'line':
+        if len(points) != 2:
+            raise ValueError(f"Line zone {spec['name']!r} needs exactly 2 points")
+        return LineZone(spec['name'], points[0], points[1], spec.get('direction', 'both'))
+    if kind == 'polygon':
+        return PolygonZone(spec['name'], points, spec.get('direction', 'in'))
+    raise ValueError(f"Unknown zone type: {kind}")
+
+
+def load_zone_specs(path):
+    with open(path) as f:
+        specs = json.load(f)
+    names = [spec['name'] for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate zone names in {path}")
+    return specs
+
+
+def load_zones(path, frame_width=None, frame_height=None):
+    return [make_zone(spec, frame_width, frame_height) for spec in load_zone_specs(path)]
+
+
+class ZoneCounter:
+    # Evaluates every zone against the movement of every track since its
+    # previous sighting, so any number of lines and polygons share one pass
+    # over the video. Each track is counted at most once per zone, and each
+    # zone keeps its own counter/minute_counter.
+    def __init__(self, zones, total_minutes, max_age=TRACK_MAX_AGE):
+        self.zones = zones
+        self.max_age = max_age
+        self.counters = {z.name: empty_counter() for z in zones}
+        self.minute_counters = {z.name: empty_minute_counter(total_minutes) for z in zones}
+        self.counted = [set() for _ in zones]
+        self.points = {}
+        self.last_seen = {}
+        self.frame = 0
+
+    def update(self, ids, cls_names, xyxy, minute, counting=True):
+        cur = np.empty((len(ids), 2))
+        cur[:, 0] = (xyxy[:, 0] + xyxy[:, 2]) / 2
+        cur[:, 1] = xyxy[:, 3]
+        points = self.points
+        prev = np.array([points.get(tid, p) for tid, p in zip(ids, cur.tolist())]).reshape(-1, 2)
+        hits = []
+        for zone, counted in zip(self.zones, self.counted):
+            for i in np.flatnonzero(zone.hits(prev, cur)).tolist():
+                tid = ids[i]
+                if tid in counted:
+                    continue
+                counted.add(tid)
+                if counting:
+                    self.counters[zone.name][cls_names[i]] += 1
+                    self.minute_counters[zone.name][minute][cls_names[i]] += 1
+                    hits.append((zone.name, tid))
+        for tid, p in zip(ids, cur.tolist()):
+            points[tid] = p
+            self.last_seen[tid] = self.frame
+        return hits
+
+    def end_frame(self):
+        self.frame += 1
+        cutoff = self.frame - self.max_age
+        stale = [tid for tid, seen in self.last_seen.items() if seen < cutoff]
+        for tid in stale:
+            del self.last_seen[tid]
+            del self.points[tid]
+            for counted in self.counted:
+                counted.discard(tid)
+
+    def draw(self, img):
+        for zone in self.zones:
+            zone.draw(img)
+
+    def results(self):
+        return {
+            z.name: {
+                'type': z.kind,
+                'direction': z.direction,
+                'counter': self.counters[z.name],
+                'minute_counter': self.minute_counters[z.name],
+            }
+            for z in self.zones
+        }